@@ -0,0 +1,299 @@
+import asyncio
+import httpx
+import http_session
+from config import Config
+from page_image import PageImage
+from deepseek_client import DeepSeekClient, TranslationClient
+from resilience import response_error, TRANSIENT_STATUS
+
+
+async def _gather_or_cancel(coroutines):
+    """Como asyncio.gather, pero si una falla (o se cancela la llamada) cancela las demás"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _with_deadline(coroutine, timeout):
+    """Espera coroutine como mucho timeout segundos (None = sin plazo)
+
+    Al vencer el plazo se cancela la llamada (y sus peticiones en curso) y
+    se lanza Exception.
+    """
+    if timeout is None:
+        return await coroutine
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        raise Exception(f"Plazo de {timeout:g}s superado")
+
+
+class _HostClients:
+    """Clientes httpx asíncronos con conexiones keep-alive, uno por servidor
+
+    httpx limita las conexiones por cliente, no por servidor: con un cliente
+    por servidor cada uno tiene su límite de HTTP_HOST_LIMITS (o
+    HTTP_POOL_MAXSIZE), igual que las sesiones de http_session.
+    """
+
+    def __init__(self):
+        self._clients = {}
+
+    def get(self, url):
+        key = http_session._host_key(url)
+        if key not in self._clients:
+            self._clients[key] = httpx.AsyncClient(limits=http_session.httpx_limits(url), timeout=None)
+        return self._clients[key]
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+class AsyncDeepSeekClient:
+    """Versión asyncio de DeepSeekClient
+
+    Usa la configuración, los prompts y el procesamiento de imágenes del
+    cliente síncrono (client), pero las peticiones se hacen con httpx desde
+    un único bucle de eventos: cientos de páginas pueden estar esperando
+    respuesta sin un hilo por petición. Un semáforo limita las peticiones
+    en curso al backend (por defecto ocr_concurrency() del cliente) y el
+    trabajo de CPU (huellas, bloques, codificación) se hace en hilos para
+    no bloquear el bucle.
+
+    Uso:
+        async with AsyncDeepSeekClient() as client:
+            texts = await client.extract_texts(pages, timeout=300)
+    """
+
+    def __init__(self, client=None, concurrency=None):
+        self._own_client = client is None
+        self.client = client or DeepSeekClient()
+        self.concurrency = concurrency or self.client.ocr_concurrency()
+        self._semaphore = None
+        self._http = _HostClients()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """Cierra las conexiones abiertas (y el índice de páginas del cliente creado aquí)"""
+        await self._http.aclose()
+        if self._own_client:
+            self.client.close()
+
+    def _get_semaphore(self):
+        # Se crea dentro del bucle de eventos que lo usa
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def extract_text_from_image(self, image, timeout=None):
+        """Extrae el texto de una imagen (ver DeepSeekClient.extract_text_from_image)
+
+        timeout es el plazo total en segundos, incluida la espera al
+        semáforo; al vencer se cancelan las peticiones en curso de la
+        página. Cancelar la tarea que llama también las cancela.
+        """
+        return await _with_deadline(self._extract(image), timeout)
+
+    async def extract_texts(self, images, timeout=None):
+        """Extrae el texto de varias imágenes a la vez, en el mismo orden
+
+        Cada imagen tiene su propio plazo; si una falla, en su posición se
+        devuelve la excepción en lugar del texto y las demás continúan.
+        """
+        return await asyncio.gather(
+            *(self.extract_text_from_image(image, timeout) for image in images),
+            return_exceptions=True
+        )
+
+    async def _extract(self, image):
+        client = self.client
+        if not isinstance(image, PageImage):
+            image = await asyncio.to_thread(PageImage.from_file, image)
+
+        fp, cached = await asyncio.to_thread(client._cached_text, image)
+        if cached is not None:
+            return cached
+
+        parts, combine = await asyncio.to_thread(client._ocr_plan, image)
+        texts = await _gather_or_cancel(self._extract_single(part) for part in parts)
+        text = combine(list(texts))
+
+        if not client._record_stream_stats(image, parts):
+            await asyncio.to_thread(client._remember_text, fp, text)
+        return text
+
+    async def _extract_single(self, image):
+        """Extrae el texto de una imagen con una sola petición al backend"""
+        if self.client.use_local:
+            return await self._extract_with_ollama(image)
+        return await self._extract_with_api(image)
+
+    async def _extract_with_ollama(self, image):
+        try:
+            url, payload = await asyncio.to_thread(self.client._ollama_request, image)
+            return await self.client.ollama_backend.call_async(
+                lambda timeout: self._post_ollama(image, url, payload, timeout)
+            )
+        except httpx.TimeoutException:
+            raise Exception("Timeout: Ollama tardó demasiado en responder")
+        except Exception as e:
+            raise Exception(f"Error en OCR Ollama: {str(e)}")
+
+    async def _post_ollama(self, image, url, payload, timeout):
+        """Envía la petición de OCR a Ollama (ver DeepSeekClient._post_ollama)"""
+        async with self._get_semaphore():
+            if not payload["stream"]:
+                response = await self._http.get(url).post(url, json=payload, timeout=timeout)
+                return self.client._ollama_text(response)
+
+            collector = self.client._stream_collector(image)
+            async with self._http.get(url).stream("POST", url, json=payload, timeout=timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise response_error(response, f"Error {response.status_code} en Ollama: {response.text}")
+                async for line in response.aiter_lines():
+                    if not collector.feed(line):
+                        break
+        return self.client._stream_text(image, collector)
+
+    async def _extract_with_api(self, image):
+        try:
+            url, payload, headers = await asyncio.to_thread(self.client._api_request, image)
+            return await self.client.api_backend.call_async(
+                lambda timeout: self._post_api(url, payload, headers, timeout)
+            )
+        except httpx.TimeoutException:
+            raise Exception("Timeout: La API de DeepSeek tardó demasiado en responder")
+        except Exception as e:
+            raise Exception(f"Error en OCR DeepSeek: {str(e)}")
+
+    async def _post_api(self, url, payload, headers, timeout):
+        async with self._get_semaphore():
+            response = await self._http.get(url).post(url, json=payload, headers=headers, timeout=timeout)
+        return self.client._api_text(response)
+
+
+class AsyncTranslationClient:
+    """Versión asyncio de TranslationClient (OpenAI primero, Ollama como fallback)
+
+    Las peticiones a Ollama se hacen con httpx y las de OpenAI con
+    openai.AsyncOpenAI, limitadas por un semáforo de TRANSLATION_CONCURRENCY
+    traducciones en curso.
+    """
+
+    def __init__(self, client=None, concurrency=None):
+        self.client = client or TranslationClient()
+        self.concurrency = concurrency or Config.TRANSLATION_CONCURRENCY
+        self._semaphore = None
+        self._http = _HostClients()
+        self._openai = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """Cierra las conexiones abiertas"""
+        await self._http.aclose()
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _get_openai(self):
+        if self._openai is None:
+            import openai
+            # Sin reintentos propios: los gestiona resilience.Backend
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=http_session.httpx_limits(http_session.openai_base_url())
+            )
+            self._openai = openai.AsyncOpenAI(api_key=self.client.openai_api_key, max_retries=0,
+                                              http_client=http_client)
+        return self._openai
+
+    async def translate_to_spanish(self, text, page_num=None, timeout=None):
+        """Traduce texto a español (ver TranslationClient.translate_to_spanish)
+
+        timeout es el plazo total en segundos; al vencer se cancela la
+        traducción y se lanza Exception.
+        """
+        return await _with_deadline(self._translate(text, page_num), timeout)
+
+    async def _translate(self, text, page_num):
+        if not text or not text.strip():
+            return text
+
+        if self.client.use_openai:
+            try:
+                print(f"[INFO] Intentando traducción con OpenAI ({self.client.openai_model})...")
+                translated = await self._translate_with_openai(text, page_num)
+                if translated and translated != text:
+                    print(f"[SUCCESS] Traducción exitosa con OpenAI")
+                    return translated
+                print(f"[WARN] OpenAI no tradujo o devolvió igual, intentando con Ollama...")
+            except Exception as e:
+                print(f"[WARN] Error en OpenAI: {str(e)}, usando Ollama como fallback...")
+
+        print(f"[INFO] Usando Ollama local para traducción...")
+        return await self._translate_with_ollama(text, page_num)
+
+    async def _translate_with_openai(self, text, page_num=None):
+        try:
+            if page_num:
+                print(f"[INFO] Traduciendo página {page_num} con OpenAI...")
+            response = await self.client.openai_backend.call_async(
+                lambda timeout: self._post_openai(text, timeout)
+            )
+            return self.client._openai_text(response)
+        except ImportError:
+            raise Exception("Librería 'openai' no instalada. Ejecuta: pip install openai")
+        except Exception as e:
+            raise Exception(f"Error en OpenAI API: {str(e)}")
+
+    async def _post_openai(self, text, timeout):
+        async with self._get_semaphore():
+            return await self._get_openai().chat.completions.create(
+                timeout=timeout, **self.client._openai_request(text)
+            )
+
+    async def _translate_with_ollama(self, text, page_num=None):
+        try:
+            if page_num:
+                print(f"[INFO] Traduciendo página {page_num}...")
+            url, payload = self.client._ollama_request(text)
+            response = await self.client.ollama_backend.call_async(
+                lambda timeout: self._post_translation(url, payload, timeout)
+            )
+            return self.client._ollama_translation(response, text)
+        except httpx.TimeoutException:
+            print(f"[ERROR] Timeout en traducción de página {page_num}")
+            return text
+        except Exception as e:
+            print(f"[ERROR] Error en traducción: {str(e)}")
+            return text
+
+    async def _post_translation(self, url, payload, timeout):
+        """Envía la petición de traducción; los errores pasajeros se lanzan para reintentarlos"""
+        async with self._get_semaphore():
+            response = await self._http.get(url).post(url, json=payload, timeout=timeout)
+        if response.status_code in TRANSIENT_STATUS:
+            raise response_error(response, f"Error {response.status_code} en traducción: {response.text}")
+        return response
@@ -0,0 +1,64 @@
+"""
+Benchmark del preprocesamiento: compara el deskew original (todos los píxeles +
+minAreaRect) con el estimador sobre miniatura (perfiles de proyección de la tinta)
+"""
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from image_analysis import estimate_skew_angle
+
+
+def create_test_page(angle, width=2550, height=3300):
+    """Crea una página de texto a 300 DPI (carta) girada angle grados"""
+    page = np.full((height, width), 255, dtype=np.uint8)
+    for line in range(40):
+        cv2.putText(page, f"Linea {line} del documento de prueba con texto escaneado",
+                    (150, 250 + line * 70), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 0, 3)
+    M = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1.0)
+    return cv2.warpAffine(page, M, (width, height), borderValue=255)
+
+
+def legacy_skew_angle(gray):
+    """Estimador original de enhance_image_for_ocr"""
+    coords = np.column_stack(np.where(gray > 0))
+    angle = cv2.minAreaRect(coords)[-1]
+    if angle < -45:
+        return -(90 + angle)
+    return -angle
+
+
+def measure(function, image, repeats=3):
+    """Retorna (resultado, segundos por llamada, memoria pico en MB)"""
+    function(image)  # Calentamiento
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(image)
+    elapsed = (time.perf_counter() - start) / repeats
+    
+    tracemalloc.start()
+    function(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    print("=" * 70)
+    print("BENCHMARK DE ESTIMACIÓN DE INCLINACIÓN (página carta a 300 DPI)")
+    print("=" * 70)
+    
+    for angle in (0.0, 1.5, -3.0):
+        page = create_test_page(angle)
+        print(f"\nInclinación real: {angle:+.1f}° (corrección esperada: {0.0 - angle:+.1f}°)")
+        
+        legacy, legacy_time, legacy_mem = measure(legacy_skew_angle, page)
+        fast, fast_time, fast_mem = measure(estimate_skew_angle, page)
+        
+        print(f"  Original : {legacy:+7.2f}°  {legacy_time*1000:8.1f} ms  {legacy_mem:8.1f} MB")
+        print(f"  Miniatura: {fast:+7.2f}°  {fast_time*1000:8.1f} ms  {fast_mem:8.1f} MB")
+        print(f"  Aceleración: {legacy_time / fast_time:.1f}x, memoria {legacy_mem / max(fast_mem, 0.01):.1f}x menor")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,89 @@ class Config:
     IMAGE_DPI = 300  # Alta resolución para mejor OCR (antes 200)
     ENHANCE_IMAGE_QUALITY = os.getenv("ENHANCE_IMAGE_QUALITY", "true").lower() == "true"
     IMAGE_SCALE_FACTOR = float(os.getenv("IMAGE_SCALE_FACTOR", "1.5"))  # Escalar 1.5x para texto pequeño
+    SAVE_DEBUG_IMAGES = os.getenv("SAVE_DEBUG_IMAGES", "false").lower() == "true"  # Guardar en disco las páginas renderizadas/preprocesadas
+    DEBUG_IMAGE_DIR = os.getenv("DEBUG_IMAGE_DIR", "")  # Carpeta para SAVE_DEBUG_IMAGES (vacío = carpeta temporal)
+    PREPROCESSING_PIPELINE = os.getenv("PREPROCESSING_PIPELINE", "grayscale,crop_to_content,downscale,denoise,deskew,upscale,threshold")  # Etapas en orden (ver image_preprocessing.py)
+    ADAPTIVE_PREPROCESSING = os.getenv("ADAPTIVE_PREPROCESSING", "true").lower() == "true"  # Solo las etapas que la página necesita
+    PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))  # Páginas preprocesadas en paralelo (1 = secuencial)
+    PREPROCESS_EXECUTOR = os.getenv("PREPROCESS_EXECUTOR", "thread").lower()  # thread o process
+    DENOISE_NOISE_THRESHOLD = float(os.getenv("DENOISE_NOISE_THRESHOLD", "3.0"))  # Ruido (desviación típica) a partir del que se elimina
+    
+    # Configuración de renderizado
+    PDF_BACKEND = os.getenv("PDF_BACKEND", "auto").lower()  # auto, pymupdf o poppler (auto = PyMuPDF si está instalado)
+    RENDER_BATCH_SIZE = int(os.getenv("RENDER_BATCH_SIZE", "1"))  # Páginas renderizadas a la vez (memoria pico constante)
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))  # Procesos de renderizado en paralelo (1 = secuencial)
+    IMAGE_PASSTHROUGH = os.getenv("IMAGE_PASSTHROUGH", "true").lower() == "true"  # Extraer la imagen escaneada sin re-rasterizar (solo PyMuPDF)
+    RENDER_COLOR_MODE = os.getenv("RENDER_COLOR_MODE", "auto").lower()  # auto, gray o rgb (auto = gris si ENHANCE_IMAGE_QUALITY)
+    
+    # Páginas en blanco (o solo con el número de página) que no se envían al OCR
+    SKIP_BLANK_PAGES = os.getenv("SKIP_BLANK_PAGES", "true").lower() == "true"
+    BLANK_PAGE_MAX_MARKS = int(os.getenv("BLANK_PAGE_MAX_MARKS", "4"))  # Marcas máximas de un número de página para considerarla vacía
+    
+    # Capa de texto nativa: páginas con puntuación de calidad menor que el umbral van a OCR
+    TEXT_QUALITY_THRESHOLD = float(os.getenv("TEXT_QUALITY_THRESHOLD", "0.5"))  # 0 = aceptar cualquier texto
+    TEXT_WORKERS = int(os.getenv("TEXT_WORKERS", str(os.cpu_count() or 1)))  # Procesos para analizar la capa de texto
+    REGION_OCR = os.getenv("REGION_OCR", "true").lower() == "true"  # OCR solo de las imágenes sin texto en páginas mixtas (solo PyMuPDF)
+    
+    # DPI adaptativo: renderizar cada página al DPI mínimo para que el texto tenga la altura x objetivo
+    ADAPTIVE_DPI = os.getenv("ADAPTIVE_DPI", "false").lower() == "true"
+    TARGET_X_HEIGHT_PX = float(os.getenv("TARGET_X_HEIGHT_PX", "20"))  # Altura x objetivo en píxeles
+    ADAPTIVE_DPI_MIN = int(os.getenv("ADAPTIVE_DPI_MIN", "100"))
+    ADAPTIVE_DPI_MAX = int(os.getenv("ADAPTIVE_DPI_MAX", "450"))
+    
+    # Presupuesto de las imágenes enviadas al modelo de OCR (por backend)
+    OLLAMA_MAX_IMAGE_PIXELS = int(os.getenv("OLLAMA_MAX_IMAGE_PIXELS", "4000000"))  # 0 = sin límite
+    OLLAMA_MAX_IMAGE_BYTES = int(os.getenv("OLLAMA_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+    DEEPSEEK_MAX_IMAGE_PIXELS = int(os.getenv("DEEPSEEK_MAX_IMAGE_PIXELS", "4000000"))
+    DEEPSEEK_MAX_IMAGE_BYTES = int(os.getenv("DEEPSEEK_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+    UPLOAD_IMAGE_QUALITY = int(os.getenv("UPLOAD_IMAGE_QUALITY", "85"))  # Calidad JPEG/WebP de páginas en gris o color
+    UPLOAD_MIN_QUALITY = int(os.getenv("UPLOAD_MIN_QUALITY", "40"))  # Calidad mínima si hay que ajustarse a los bytes máximos
+    
+    # OCR por piezas de páginas mucho más grandes que la entrada del modelo (planos, A3)
+    TILED_OCR = os.getenv("TILED_OCR", "true").lower() == "true"
+    OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "96"))  # Píxeles de solape entre piezas
+    OCR_TILE_WORKERS = int(os.getenv("OCR_TILE_WORKERS", "2"))  # Peticiones de piezas en paralelo
+    
+    # Reutilizar el OCR de páginas casi idénticas (portadas, condiciones, plantillas)
+    DEDUP_PAGES = os.getenv("DEDUP_PAGES", "true").lower() == "true"
+    OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "")  # Base de datos SQLite compartida entre ejecuciones (vacío = solo en memoria)
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "2000"))  # Páginas guardadas como máximo (0 = sin límite)
+    OCR_CACHE_MAX_AGE_DAYS = float(os.getenv("OCR_CACHE_MAX_AGE_DAYS", "90"))  # Días que se conserva una página (0 = sin límite)
+    
+    # Enviar al modelo solo los bloques de texto (sin fotos, logos ni zonas en blanco)
+    LAYOUT_DETECTION = os.getenv("LAYOUT_DETECTION", "true").lower() == "true"
+    LAYOUT_REQUESTS = os.getenv("LAYOUT_REQUESTS", "combined").lower()  # combined = una imagen con todos los bloques, blocks = una petición por bloque
+    LAYOUT_MAX_COVERAGE = float(os.getenv("LAYOUT_MAX_COVERAGE", "0.6"))  # Si los bloques ocupan más, se envía la página entera
+    
+    # Respuesta de Ollama en streaming, cortando bucles y respuestas demasiado largas
+    OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "true").lower() == "true"
+    OCR_MAX_OUTPUT_CHARS = int(os.getenv("OCR_MAX_OUTPUT_CHARS", "12000"))  # 0 = sin límite (solo num_predict)
+    OCR_REPETITION_LIMIT = int(os.getenv("OCR_REPETITION_LIMIT", "8"))  # Repeticiones seguidas de un fragmento para cortar; 0 = no cortar
+    
+    # Páginas en OCR a la vez (por backend)
+    OLLAMA_OCR_CONCURRENCY = int(os.getenv("OLLAMA_OCR_CONCURRENCY", "1"))  # Ajustar a OLLAMA_NUM_PARALLEL del servidor
+    DEEPSEEK_OCR_CONCURRENCY = int(os.getenv("DEEPSEEK_OCR_CONCURRENCY", "4"))
+    
+    # Traducciones en curso a la vez (cliente asíncrono)
+    TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+    
+    # Reintentos, circuito y timeouts de los backends (Ollama, DeepSeek, OpenAI)
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))  # Intentos por petición (1 = sin reintentos)
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "2"))  # Segundos; se dobla en cada reintento (con jitter)
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))  # Espera máxima, también con Retry-After
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # Fallos seguidos para dejar de llamar
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))  # Tiempo sin llamar antes de probar de nuevo
+    OLLAMA_OCR_TIMEOUT = float(os.getenv("OLLAMA_OCR_TIMEOUT", "600"))  # Timeout máximo (y inicial) en segundos
+    DEEPSEEK_API_TIMEOUT = float(os.getenv("DEEPSEEK_API_TIMEOUT", "120"))
+    TRANSLATION_TIMEOUT = float(os.getenv("TRANSLATION_TIMEOUT", "120"))
+    ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "true").lower() == "true"
+    TIMEOUT_PERCENTILE = float(os.getenv("TIMEOUT_PERCENTILE", "95"))  # Percentil de las latencias observadas
+    TIMEOUT_MULTIPLIER = float(os.getenv("TIMEOUT_MULTIPLIER", "3"))  # Margen sobre ese percentil
+    TIMEOUT_MIN_SECONDS = float(os.getenv("TIMEOUT_MIN_SECONDS", "30"))
+    
+    # Conexiones HTTP compartidas con los backends (keep-alive)
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # Conexiones máximas por servidor
+    HTTP_HOST_LIMITS = os.getenv("HTTP_HOST_LIMITS", "")  # Límites por servidor: "localhost:11434=4,api.deepseek.com=8"
     
     # Configuración general
     SUPPORTED_FORMATS = ['.pdf', '.PDF']
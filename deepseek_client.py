@@ -1,16 +1,46 @@
 import requests
 import base64
+import http_session
 import time
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from page_image import PageImage
+from upload_encoder import encode_for_upload
+from tiled_ocr import needs_tiling, split_page, stitch
+from page_cache import PageCache, fingerprint
+from layout_analysis import text_blocks, block_coverage, crop_blocks, compose_blocks
+from ollama_stream import StreamCollector, combine_stats, TRUNCATION_REASONS
+from resilience import backend, response_error, BackendError, TRANSIENT_STATUS
 
 class DeepSeekClient:
-    def __init__(self):
+    # Formatos de imagen que acepta cada backend al enviarle una página
+    UPLOAD_FORMATS = {
+        "ollama": ("png", "jpeg"),
+        "api": ("png", "jpeg", "webp"),
+    }
+    
+    def __init__(self, partial_text_callback=None):
         self.use_local = Config.USE_LOCAL_MODEL
         self.api_key = Config.DEEPSEEK_API_KEY
         self.api_url = "https://api.deepseek.com/chat/completions"
         self.ollama_url = Config.OLLAMA_URL
         self.ollama_model = Config.OLLAMA_MODEL
         
+        # Reintentos, circuito, timeout adaptativo y peticiones en curso de cada
+        # backend (compartidos entre clientes e hilos)
+        self.ollama_backend = backend("Ollama OCR", Config.OLLAMA_OCR_TIMEOUT,
+                                      max(1, Config.OLLAMA_OCR_CONCURRENCY))
+        self.api_backend = backend("DeepSeek API", Config.DEEPSEEK_API_TIMEOUT,
+                                   max(1, Config.DEEPSEEK_OCR_CONCURRENCY))
+        
+        # Con OLLAMA_STREAM, se llama con (imagen, texto_parcial) a medida que llega el texto
+        self.partial_text_callback = partial_text_callback
+        
+        # Índice de páginas ya reconocidas (portadas, condiciones, plantillas repetidas)
+        self.page_cache = PageCache(
+            Config.OCR_CACHE_PATH or None, Config.OCR_CACHE_MAX_ENTRIES, Config.OCR_CACHE_MAX_AGE_DAYS
+        ) if Config.DEDUP_PAGES else None
+        
         # Verificar configuración
         if self.use_local:
             self._verify_ollama_connection()
@@ -20,7 +50,7 @@ class DeepSeekClient:
     def _verify_ollama_connection(self):
         """Verifica que Ollama esté disponible"""
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = http_session.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get('models', [])
                 model_names = [m.get('name', '') for m in models]
@@ -30,22 +60,222 @@ class DeepSeekClient:
         except Exception as e:
             raise Exception(f"No se puede conectar a Ollama en {self.ollama_url}: {str(e)}")
     
-    def extract_text_from_image(self, image_path):
-        """Extrae texto de imagen usando DeepSeek OCR (local o API)"""
+    def extract_text_from_image(self, image):
+        """Extrae texto de imagen usando DeepSeek OCR (local o API)
+        
+        image puede ser un PageImage en memoria o la ruta de un archivo. Con
+        DEDUP_PAGES, si la página es casi idéntica a otra ya reconocida con
+        el mismo modelo (en este documento o, con OCR_CACHE_PATH, en uno
+        anterior) se reutiliza su texto sin llamar al modelo. Las imágenes
+        que se envían al modelo las decide _ocr_plan (bloques de texto,
+        piezas de páginas grandes o la página entera).
+        """
+        if not isinstance(image, PageImage):
+            image = PageImage.from_file(image)
+        
+        fp, cached = self._cached_text(image)
+        if cached is not None:
+            return cached
+        
+        parts, combine = self._ocr_plan(image)
+        if len(parts) == 1:
+            texts = [self._extract_single(parts[0])]
+        else:
+            workers = max(1, min(Config.OCR_TILE_WORKERS, self.ocr_concurrency(), len(parts)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                texts = list(executor.map(self._extract_single, parts))
+        text = combine(texts)
+        
+        if not self._record_stream_stats(image, parts):
+            self._remember_text(fp, text)
+        return text
+    
+    def _record_stream_stats(self, image, parts):
+        """Pasa a image.metadata["ocr_stream"] las métricas de generación de sus partes
+        
+        Las partes (piezas, bloques unidos) son imágenes temporales: sus
+        métricas se combinan en las de la página (ver
+        ollama_stream.combine_stats). Con OLLAMA_STREAM la respuesta se
+        corta si el modelo entra en bucle ("repetition") o es demasiado
+        larga ("max_length"): el texto puede estar incompleto, así que se
+        anota en image.metadata["ocr_truncated"], no se reutiliza y la
+        página se informa como truncada. Retorna el motivo de corte o None.
+        """
+        stats = combine_stats([part.metadata["ocr_stream"] for part in parts if "ocr_stream" in part.metadata])
+        if stats is None:
+            return None
+        image.metadata["ocr_stream"] = stats
+        if stats["stop_reason"] in TRUNCATION_REASONS:
+            image.metadata["ocr_truncated"] = stats["stop_reason"]
+            return stats["stop_reason"]
+        return None
+    
+    def _cached_text(self, page):
+        """Busca la página en el índice de páginas ya reconocidas
+        
+        Retorna (huella, texto): texto es None si no hay una página igual;
+        la huella se pasa después a _remember_text (None sin DEDUP_PAGES).
+        """
+        if self.page_cache is None:
+            return None, None
+        fp = fingerprint(page.to_gray())
+        cached = self.page_cache.lookup(fp, self.model_key())
+        if cached is not None:
+            print(f"[INFO] Página {page.page_num}: igual a una página ya reconocida, se reutiliza su texto")
+        return fp, cached
+    
+    def _remember_text(self, fp, text):
+        """Guarda el texto reconocido en el índice de páginas (si está activo)"""
+        if fp is not None and text.strip():
+            self.page_cache.store(fp, self.model_key(), text)
+    
+    def close(self):
+        """Cierra la base de datos del índice de páginas (se reabre si se vuelve a usar)"""
+        if self.page_cache is not None:
+            self.page_cache.close()
+    
+    def _ocr_plan(self, page):
+        """Decide qué imágenes se envían al modelo para reconocer la página
+        
+        Retorna (partes, unir): la lista de imágenes que se envían cada una
+        en una petición y la función que une sus textos (en el mismo orden)
+        en el texto de la página. Con LAYOUT_DETECTION solo se envían los
+        bloques de texto (ver _layout_plan); con TILED_OCR, las imágenes
+        mucho más grandes que la entrada del modelo se dividen en piezas
+        (ver _tile_plan).
+        """
+        if Config.LAYOUT_DETECTION:
+            plan = self._layout_plan(page)
+            if plan is not None:
+                return plan
+        return self._tile_plan(page)
+    
+    def _tile_plan(self, page):
+        """Plan de OCR de una imagen entera: en piezas solapadas si es demasiado grande
+        
+        La página se divide en franjas (o rejilla, si es muy ancha) que
+        caben a resolución completa en la entrada del modelo, con
+        OCR_TILE_OVERLAP píxeles de solape para no partir líneas. Las piezas
+        se envían en paralelo (OCR_TILE_WORKERS peticiones a la vez) y el
+        texto se une en orden quitando las líneas repetidas del solape.
+        """
+        if not (Config.TILED_OCR and needs_tiling(page, self.upload_budget()["max_pixels"])):
+            return [page], lambda texts: texts[0]
+        
+        tiles = split_page(page, self.upload_budget()["max_pixels"], Config.OCR_TILE_OVERLAP)
+        flat = [tile for row in tiles for tile in row]
+        workers = max(1, min(Config.OCR_TILE_WORKERS, self.ocr_concurrency()))
+        print(f"[INFO] Página {page.page_num}: {page.width}x{page.height}px, OCR en {len(flat)} piezas "
+              f"({len(tiles)}x{len(tiles[0])}) con hasta {workers} peticiones en paralelo")
+        
+        columns = len(tiles[0])
+        
+        def combine(texts):
+            return stitch([texts[r * columns:(r + 1) * columns] for r in range(len(tiles))])
+        return flat, combine
+    
+    def _layout_plan(self, page):
+        """Plan de OCR solo de los bloques de texto de la página
+        
+        Localiza los bloques de texto (ver layout_analysis.text_blocks) y, si
+        ocupan como mucho LAYOUT_MAX_COVERAGE de la página, envía solo esos
+        recortes en orden de lectura: unidos en una imagen (LAYOUT_REQUESTS =
+        "combined") o uno por petición ("blocks"). Las fotos, logos y zonas
+        en blanco no se envían: menos píxeles que procesar y menos texto
+        inventado sobre zonas sin texto. Retorna None si hay que enviar la
+        página entera (sin bloques detectados o sin ahorro suficiente).
+        """
+        if "region" in page.metadata or "tile" in page.metadata:
+            return None
+        blocks = text_blocks(page.to_gray())
+        if not blocks:
+            return None
+        coverage = block_coverage(blocks, page.width, page.height)
+        if coverage > Config.LAYOUT_MAX_COVERAGE:
+            return None
+        
+        print(f"[INFO] Página {page.page_num}: {len(blocks)} bloque(s) de texto, "
+              f"{coverage:.0%} de la página")
+        if Config.LAYOUT_REQUESTS != "blocks":
+            return self._tile_plan(compose_blocks(page, blocks))
+        
+        plans = [self._tile_plan(block) for block in crop_blocks(page, blocks)]
+        parts = [part for block_parts, _ in plans for part in block_parts]
+        
+        def combine(texts):
+            block_texts = []
+            for block_parts, block_combine in plans:
+                block_texts.append(block_combine(texts[:len(block_parts)]))
+                texts = texts[len(block_parts):]
+            return "\n\n".join(text.strip("\n") for text in block_texts if text.strip())
+        return parts, combine
+    
+    def model_key(self):
+        """Identificador del modelo de OCR activo (el texto de otro modelo no se reutiliza)"""
+        if self.use_local:
+            return f"ollama:{self.ollama_model}"
+        return "api:deepseek-chat"
+    
+    def _extract_single(self, image):
+        """Extrae el texto de una imagen con una sola petición al backend"""
         if self.use_local:
-            return self._extract_with_ollama(image_path)
+            return self._extract_with_ollama(image)
         else:
-            return self._extract_with_api(image_path)
+            return self._extract_with_api(image)
     
-    def _extract_with_ollama(self, image_path):
-        """Extrae texto usando modelo local de Ollama"""
-        try:
-            # Convertir imagen a base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Prompt mejorado para máxima extracción de texto
-            prompt = """Extrae TODO el texto visible en esta imagen con máxima precisión. 
+    def upload_budget(self):
+        """Presupuesto de subida del backend activo (ver upload_encoder.encode_for_upload)"""
+        if self.use_local:
+            return {
+                "formats": self.UPLOAD_FORMATS["ollama"],
+                "max_pixels": Config.OLLAMA_MAX_IMAGE_PIXELS,
+                "max_bytes": Config.OLLAMA_MAX_IMAGE_BYTES,
+                "quality": Config.UPLOAD_IMAGE_QUALITY,
+                "min_quality": Config.UPLOAD_MIN_QUALITY,
+            }
+        return {
+            "formats": self.UPLOAD_FORMATS["api"],
+            "max_pixels": Config.DEEPSEEK_MAX_IMAGE_PIXELS,
+            "max_bytes": Config.DEEPSEEK_MAX_IMAGE_BYTES,
+            "quality": Config.UPLOAD_IMAGE_QUALITY,
+            "min_quality": Config.UPLOAD_MIN_QUALITY,
+        }
+    
+    def ocr_concurrency(self):
+        """Peticiones de OCR que pueden estar en curso a la vez con el backend activo
+        
+        Limita también las piezas y bloques de una página: aunque haya
+        varias páginas y OCR_TILE_WORKERS hilos por página, el backend no
+        recibe más peticiones a la vez (ver resilience.Backend).
+        """
+        if self.use_local:
+            return max(1, Config.OLLAMA_OCR_CONCURRENCY)
+        return max(1, Config.DEEPSEEK_OCR_CONCURRENCY)
+    
+    def _encode_image(self, image):
+        """Codifica la imagen para el backend activo
+        
+        Retorna (base64, tipo_mime). Se elige la codificación más pequeña que
+        cabe en el presupuesto del backend: PNG de 1 bit para páginas
+        binarizadas, JPEG/WebP ajustado para gris o color, y resolución
+        limitada a la de entrada del modelo. image puede ser un PageImage o
+        la ruta de un archivo.
+        """
+        if not isinstance(image, PageImage):
+            image = PageImage.from_file(image)
+        encoded = encode_for_upload(image, self.upload_budget())
+        quality = f" q={encoded['quality']}" if encoded["quality"] else ""
+        print(f"[DEBUG] Imagen codificada como {encoded['format']}{quality}: "
+              f"{encoded['width']}x{encoded['height']}px, {len(encoded['data'])/1024:.0f}KB")
+        return base64.b64encode(encoded["data"]).decode('utf-8'), encoded["mime_type"]
+    
+    def _ollama_request(self, image):
+        """Petición de OCR a Ollama para la imagen: (url, payload)"""
+        # Convertir imagen a base64
+        base64_image, _ = self._encode_image(image)
+        
+        # Prompt mejorado para máxima extracción de texto
+        prompt = """Extrae TODO el texto visible en esta imagen con máxima precisión. 
 Instrucciones:
 - Lee TODO el texto, incluyendo encabezados, párrafos, números, fechas y notas al pie
 - Mantén el formato original y la estructura de párrafos
@@ -55,74 +285,129 @@ Instrucciones:
 - Devuelve el texto completo sin resumen ni comentarios adicionales
 
 Texto:"""
-            
-            # Payload para Ollama (configuración optimizada para OCR)
-            payload = {
-                "model": self.ollama_model,
-                "prompt": prompt,
-                "images": [base64_image],
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,  # Baja temperatura para respuestas más precisas
-                    "num_ctx": 8192,     # Contexto extendido para documentos largos
-                    "num_predict": 4096  # Más tokens de salida para textos largos
-                }
+        
+        # Payload para Ollama (configuración optimizada para OCR)
+        payload = {
+            "model": self.ollama_model,
+            "prompt": prompt,
+            "images": [base64_image],
+            "stream": Config.OLLAMA_STREAM,
+            "options": {
+                "temperature": 0.1,  # Baja temperatura para respuestas más precisas
+                "num_ctx": 8192,     # Contexto extendido para documentos largos
+                "num_predict": 4096  # Más tokens de salida para textos largos
             }
+        }
+        return f"{self.ollama_url}/api/generate", payload
+    
+    def _ollama_text(self, response):
+        """Texto reconocido de una respuesta de Ollama (requests o httpx)"""
+        if response.status_code != 200:
+            raise response_error(response, f"Error {response.status_code} en Ollama: {response.text}")
+        
+        result = response.json()
+        extracted_text = result.get('response', '').strip()
+        
+        print(f"[DEBUG] Respuesta recibida: {len(extracted_text)} caracteres")
+        
+        # Si la respuesta está vacía, intentar con contexto
+        if not extracted_text:
+            context = result.get('context', [])
+            print(f"[DEBUG] Respuesta vacía. Context tokens: {len(context)}")
             
-            print(f"[DEBUG] Enviando imagen a {self.ollama_model}... (tiempo estimado: 2 minutos)")
-            
-            # Llamada a Ollama (cada página tarda ~2 minutos según pruebas)
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=payload,
-                timeout=600  # 10 minutos de timeout por página para documentos complejos
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Error {response.status_code} en Ollama: {response.text}")
-            
-            result = response.json()
-            extracted_text = result.get('response', '').strip()
+            # Verificar si hay un done_reason
+            done_reason = result.get('done_reason', 'unknown')
+            print(f"[DEBUG] Done reason: {done_reason}")
             
-            print(f"[DEBUG] Respuesta recibida: {len(extracted_text)} caracteres")
+            raise Exception(f"Ollama devolvió respuesta vacía (done_reason: {done_reason}). Verifica que la imagen contenga texto legible.")
+        
+        return extracted_text
+    
+    def _stream_collector(self, image):
+        """Acumulador del stream de Ollama para la imagen (ver ollama_stream.StreamCollector)"""
+        on_text = None
+        if self.partial_text_callback is not None:
+            def on_text(text):
+                self.partial_text_callback(image, text)
+        return StreamCollector(on_text, Config.OCR_MAX_OUTPUT_CHARS, Config.OCR_REPETITION_LIMIT)
+    
+    def _stream_text(self, image, collector):
+        """Texto reconocido de un stream de Ollama ya leído, con sus métricas"""
+        stats = collector.stats()
+        image.metadata["ocr_stream"] = stats
+        print(f"[DEBUG] Respuesta recibida: {len(collector.text)} caracteres, primer token a los "
+              f"{stats['first_token_seconds']}s, {stats['tokens']} tokens ({stats['tokens_per_second']} tokens/s)")
+        
+        if collector.stop_reason is None:
+            raise BackendError("Ollama cerró el stream sin terminar la respuesta", transient=True)
+        if collector.stop_reason == "repetition":
+            print(f"[WARN] El modelo repetía el mismo texto en bucle, generación cortada")
+        elif collector.stop_reason == "max_length":
+            print(f"[WARN] Respuesta de más de {Config.OCR_MAX_OUTPUT_CHARS} caracteres, generación cortada")
+        
+        extracted_text = collector.text.strip()
+        if not extracted_text:
+            raise Exception(f"Ollama devolvió respuesta vacía (done_reason: {collector.done_reason}). Verifica que la imagen contenga texto legible.")
+        return extracted_text
+    
+    def _extract_with_ollama(self, image):
+        """Extrae texto usando modelo local de Ollama
+        
+        Los errores pasajeros (conexión, 5xx, modelo recargándose) se
+        reintentan según la política de ollama_backend (ver resilience.Backend).
+        """
+        try:
+            url, payload = self._ollama_request(image)
             
-            # Si la respuesta está vacía, intentar con contexto
-            if not extracted_text:
-                context = result.get('context', [])
-                print(f"[DEBUG] Respuesta vacía. Context tokens: {len(context)}")
-                
-                # Verificar si hay un done_reason
-                done_reason = result.get('done_reason', 'unknown')
-                print(f"[DEBUG] Done reason: {done_reason}")
-                
-                raise Exception(f"Ollama devolvió respuesta vacía (done_reason: {done_reason}). Verifica que la imagen contenga texto legible.")
+            print(f"[DEBUG] Enviando imagen a {self.ollama_model}... (tiempo estimado: 2 minutos)")
             
-            return extracted_text
+            # Llamada a Ollama (cada página tarda ~2 minutos según pruebas)
+            return self.ollama_backend.call(lambda timeout: self._post_ollama(image, url, payload, timeout))
             
         except requests.exceptions.Timeout:
             raise Exception("Timeout: Ollama tardó demasiado en responder")
         except Exception as e:
             raise Exception(f"Error en OCR Ollama: {str(e)}")
     
-    def _extract_with_api(self, image_path):
-        """Extrae texto usando API de DeepSeek"""
-        try:
-            if not self.api_key or self.api_key == "":
-                raise Exception("API Key de DeepSeek no configurada")
-            
-            # Convertir imagen a base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # Prompt mejorado siguiendo las mejores prácticas de DeepSeek-OCR
-            # Formato: <image>\n<|grounding|>... para documentos estructurados
-            # o <image>\nFree OCR... para extracción simple de texto
-            ocr_prompt = """<image>
+    def _post_ollama(self, image, url, payload, timeout):
+        """Envía la petición de OCR a Ollama y retorna el texto
+        
+        Con OLLAMA_STREAM la respuesta se lee token a token: el texto parcial
+        se pasa a partial_text_callback y la generación se corta en cuanto
+        el modelo entra en un bucle o supera OCR_MAX_OUTPUT_CHARS (al cerrar
+        la conexión Ollama deja de generar). El timeout es entonces el
+        tiempo máximo sin recibir datos, no el de toda la respuesta.
+        """
+        if not payload["stream"]:
+            response = http_session.post(url, json=payload, timeout=timeout)
+            return self._ollama_text(response)
+        
+        collector = self._stream_collector(image)
+        with http_session.post(url, json=payload, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise response_error(response, f"Error {response.status_code} en Ollama: {response.text}")
+            for line in response.iter_lines():
+                if not collector.feed(line):
+                    break
+        return self._stream_text(image, collector)
+    
+    def _api_request(self, image):
+        """Petición de OCR a la API de DeepSeek para la imagen: (url, payload, headers)"""
+        if not self.api_key or self.api_key == "":
+            raise Exception("API Key de DeepSeek no configurada")
+        
+        # Convertir imagen a base64
+        base64_image, mime_type = self._encode_image(image)
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Prompt mejorado siguiendo las mejores prácticas de DeepSeek-OCR
+        # Formato: <image>\n<|grounding|>... para documentos estructurados
+        # o <image>\nFree OCR... para extracción simple de texto
+        ocr_prompt = """<image>
 <|grounding|>Extrae TODO el texto de este documento con máxima precisión y completitud.
 
 Instrucciones:
@@ -134,39 +419,45 @@ Instrucciones:
 - Si hay elementos no textuales (logos, imágenes), solo extrae el texto
 
 Devuelve el texto completo extraido:"""
-            
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": f"data:image/png;base64,{base64_image}"
-                            },
-                            {
-                                "type": "text", 
-                                "text": ocr_prompt
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 8000,      # Aumentado para capturar más texto
-                "temperature": 0.1       # Baja temperatura para precissión
-            }
-            
-            # Aumentar timeout para procesamiento largo
-            response = requests.post(self.api_url, json=payload, headers=headers, timeout=120)
-            
-            if response.status_code != 200:
-                error_detail = response.text
-                raise Exception(f"Error {response.status_code} en DeepSeek API: {error_detail}")
-            
-            result = response.json()
-            extracted_text = result['choices'][0]['message']['content']
-            
-            return extracted_text
+        
+        payload = {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": f"data:{mime_type};base64,{base64_image}"
+                        },
+                        {
+                            "type": "text", 
+                            "text": ocr_prompt
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 8000,      # Aumentado para capturar más texto
+            "temperature": 0.1       # Baja temperatura para precissión
+        }
+        return self.api_url, payload, headers
+    
+    def _api_text(self, response):
+        """Texto reconocido de una respuesta de la API de DeepSeek (requests o httpx)"""
+        if response.status_code != 200:
+            error_detail = response.text
+            raise response_error(response, f"Error {response.status_code} en DeepSeek API: {error_detail}")
+        
+        result = response.json()
+        return result['choices'][0]['message']['content']
+    
+    def _extract_with_api(self, image):
+        """Extrae texto usando API de DeepSeek"""
+        try:
+            url, payload, headers = self._api_request(image)
+            return self.api_backend.call(lambda timeout: self._api_text(
+                http_session.post(url, json=payload, headers=headers, timeout=timeout)
+            ))
             
         except requests.exceptions.Timeout:
             raise Exception("Timeout: La API de DeepSeek tardó demasiado en responder")
@@ -194,6 +485,10 @@ class TranslationClient:
         self.ollama_url = Config.OLLAMA_URL
         self.ollama_model = Config.TRANSLATION_MODEL
         
+        # Reintentos, circuito y timeout adaptativo de cada backend
+        self.openai_backend = backend("OpenAI", Config.TRANSLATION_TIMEOUT)
+        self.ollama_backend = backend("Ollama traducción", Config.TRANSLATION_TIMEOUT)
+        
         # Verificar configuración
         if self.use_openai:
             if not self.openai_api_key:
@@ -230,54 +525,51 @@ class TranslationClient:
         print(f"[INFO] Usando Ollama local para traducción...")
         return self._translate_with_ollama(text, page_num)
     
+    def _openai_request(self, text):
+        """Argumentos de chat.completions.create para traducir text con OpenAI"""
+        return {
+            "model": self.openai_model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Eres un traductor profesional. Traduce el texto al español manteniendo el formato original. Si el texto ya está en español, devuélvelo sin cambios."
+                },
+                {
+                    "role": "user",
+                    "content": f"Traduce este texto al español:\n\n{text}"
+                }
+            ],
+            "temperature": 0.3,
+            "max_tokens": 4000
+        }
+    
+    def _openai_text(self, response):
+        """Texto traducido de una respuesta de OpenAI"""
+        translated_text = response.choices[0].message.content.strip()
+        print(f"[DEBUG] OpenAI: Traducción completada ({len(translated_text)} caracteres)")
+        return translated_text
+    
     def _translate_with_openai(self, text, page_num=None):
         """Traduce usando OpenAI API"""
         try:
-            import openai
-            
             if page_num:
                 print(f"[INFO] Traduciendo página {page_num} con OpenAI...")
             
-            client = openai.OpenAI(api_key=self.openai_api_key)
-            
-            response = client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Eres un traductor profesional. Traduce el texto al español manteniendo el formato original. Si el texto ya está en español, devuélvelo sin cambios."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Traduce este texto al español:\n\n{text}"
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=4000
+            client = http_session.openai_client(self.openai_api_key)
+            response = self.openai_backend.call(
+                lambda timeout: client.chat.completions.create(timeout=timeout, **self._openai_request(text))
             )
-            
-            translated_text = response.choices[0].message.content.strip()
-            print(f"[DEBUG] OpenAI: Traducción completada ({len(translated_text)} caracteres)")
-            return translated_text
+            return self._openai_text(response)
             
         except ImportError:
             raise Exception("Librería 'openai' no instalada. Ejecuta: pip install openai")
         except Exception as e:
             raise Exception(f"Error en OpenAI API: {str(e)}")
     
-    def _translate_with_ollama(self, text, page_num=None):
-        """Traduce usando Ollama local (fallback o método único)"""
-        print(f"[DEBUG TRANSLATOR] translate_to_spanish llamado para página {page_num}")
-        print(f"[DEBUG TRANSLATOR] Longitud del texto: {len(text)} caracteres")
-        try:
-            if not text or not text.strip():
-                print(f"[DEBUG TRANSLATOR] Texto vacío, retornando sin traducir")
-                return text
-            
-            print(f"[DEBUG TRANSLATOR] Enviando texto al LLM para traducción...")
-            
-            # Prompt más directo y específico para traducción
-            prompt = f"""Eres un traductor profesional. Tu tarea es TRADUCIR el siguiente texto al español.
+    def _ollama_request(self, text):
+        """Petición de traducción a Ollama: (url, payload)"""
+        # Prompt más directo y específico para traducción
+        prompt = f"""Eres un traductor profesional. Tu tarea es TRADUCIR el siguiente texto al español.
 
 REGLAS IMPORTANTES:
 - Si el texto ya está en español, devuélvelo SIN CAMBIOS
@@ -290,6 +582,58 @@ TEXTO A TRADUCIR:
 {text}
 
 TRADUCCIÓN AL ESPAÑOL:"""
+        
+        payload = {
+            "model": self.ollama_model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": 4000
+            }
+        }
+        return f"{self.ollama_url}/api/generate", payload
+    
+    def _post_translation(self, url, payload, timeout):
+        """Envía la petición de traducción; los errores pasajeros se lanzan para reintentarlos"""
+        response = http_session.post(url, json=payload, timeout=timeout)
+        if response.status_code in TRANSIENT_STATUS:
+            raise response_error(response, f"Error {response.status_code} en traducción: {response.text}")
+        return response
+    
+    def _ollama_translation(self, response, text):
+        """Texto traducido de una respuesta de Ollama (el original si falla o está vacía)"""
+        print(f"[DEBUG] Status code de respuesta: {response.status_code}")
+        
+        if response.status_code != 200:
+            print(f"[ERROR] Error en traducción: {response.status_code}")
+            print(f"[ERROR] Respuesta: {response.text}")
+            return text  # Devolver original si falla
+        
+        result = response.json()
+        translated_text = result.get('response', '').strip()
+        
+        print(f"[DEBUG] Longitud texto original: {len(text)}")
+        print(f"[DEBUG] Longitud texto traducido: {len(translated_text)}")
+        print(f"[DEBUG] Primeros 200 caracteres traducidos: {translated_text[:200]}...")
+        
+        if translated_text:
+            print(f"[SUCCESS] Traducción completada exitosamente")
+            return translated_text
+        else:
+            print(f"[WARN] Traducción vacía, usando texto original")
+            return text
+    
+    def _translate_with_ollama(self, text, page_num=None):
+        """Traduce usando Ollama local (fallback o método único)"""
+        print(f"[DEBUG TRANSLATOR] translate_to_spanish llamado para página {page_num}")
+        print(f"[DEBUG TRANSLATOR] Longitud del texto: {len(text)} caracteres")
+        try:
+            if not text or not text.strip():
+                print(f"[DEBUG TRANSLATOR] Texto vacío, retornando sin traducir")
+                return text
+            
+            print(f"[DEBUG TRANSLATOR] Enviando texto al LLM para traducción...")
             
             if page_num:
                 print(f"[INFO] Traduciendo página {page_num}...")
@@ -298,43 +642,10 @@ TRADUCCIÓN AL ESPAÑOL:"""
             print(f"[DEBUG] URL Ollama: {self.ollama_url}")
             print(f"[DEBUG] Primeros 200 caracteres del texto: {text[:200]}...")
             
-            payload = {
-                "model": self.ollama_model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "num_predict": 4000
-                }
-            }
-            
+            url, payload = self._ollama_request(text)
             print(f"[DEBUG] Enviando request a Ollama...")
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=payload,
-                timeout=120  # 2 minutos por traducción
-            )
-            
-            print(f"[DEBUG] Status code de respuesta: {response.status_code}")
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Error en traducción: {response.status_code}")
-                print(f"[ERROR] Respuesta: {response.text}")
-                return text  # Devolver original si falla
-            
-            result = response.json()
-            translated_text = result.get('response', '').strip()
-            
-            print(f"[DEBUG] Longitud texto original: {len(text)}")
-            print(f"[DEBUG] Longitud texto traducido: {len(translated_text)}")
-            print(f"[DEBUG] Primeros 200 caracteres traducidos: {translated_text[:200]}...")
-            
-            if translated_text:
-                print(f"[SUCCESS] Traducción completada exitosamente")
-                return translated_text
-            else:
-                print(f"[WARN] Traducción vacía, usando texto original")
-                return text
+            response = self.ollama_backend.call(lambda timeout: self._post_translation(url, payload, timeout))
+            return self._ollama_translation(response, text)
                 
         except requests.exceptions.Timeout:
             print(f"[ERROR] Timeout en traducción de página {page_num}")
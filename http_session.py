@@ -0,0 +1,114 @@
+import os
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+
+_sessions = {}
+_openai_clients = {}
+_lock = threading.Lock()
+_warned_limits = set()
+
+
+def _host_key(url):
+    """Esquema y host:puerto de una URL (una sesión por servidor)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def host_limits():
+    """Conexiones máximas por servidor indicadas en HTTP_HOST_LIMITS ("host:puerto=N,...")
+
+    Las entradas mal escritas (sin "=", sin host o con un límite que no es
+    un entero positivo) se ignoran con un aviso en lugar de hacer fallar la
+    primera petición.
+    """
+    limits = {}
+    for item in Config.HTTP_HOST_LIMITS.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, limit = item.rpartition("=")
+        if host.strip() and limit.strip().isdigit() and int(limit) > 0:
+            limits[host.strip()] = int(limit)
+        elif item not in _warned_limits:
+            _warned_limits.add(item)
+            print(f"[WARN] HTTP_HOST_LIMITS: entrada '{item}' no válida (se espera host:puerto=N), se ignora")
+    return limits
+
+
+def host_limit(url):
+    """Conexiones máximas al servidor de url (HTTP_HOST_LIMITS o HTTP_POOL_MAXSIZE)"""
+    return max(1, host_limits().get(urlsplit(url).netloc, Config.HTTP_POOL_MAXSIZE))
+
+
+def httpx_limits(url):
+    """Límites de un pool de httpx para el servidor de url (los mismos que las sesiones)"""
+    import httpx
+
+    limit = host_limit(url)
+    return httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+
+
+def openai_base_url():
+    """URL de la API de OpenAI que usa la librería openai"""
+    return os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+
+
+def get_session(url):
+    """Sesión HTTP compartida del servidor de url (conexiones keep-alive reutilizadas)
+
+    Hay una requests.Session por servidor, con un pool de como mucho
+    HTTP_POOL_MAXSIZE conexiones (o el límite de ese host en
+    HTTP_HOST_LIMITS). Si todas están ocupadas, la petición espera a que
+    quede una libre en lugar de abrir otra, así el límite se respeta aunque
+    haya varios hilos enviando páginas. El pool de urllib3 es seguro entre
+    hilos; la creación de sesiones está protegida con un lock.
+    """
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=host_limit(url), pool_block=True)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def get(url, **kwargs):
+    """requests.get sobre la sesión compartida del servidor"""
+    return get_session(url).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """requests.post sobre la sesión compartida del servidor"""
+    return get_session(url).post(url, **kwargs)
+
+
+def openai_client(api_key):
+    """Cliente de OpenAI compartido (uno por API key, con los límites de conexiones de su servidor)"""
+    import openai
+
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            # Sin reintentos propios: los gestiona resilience.Backend
+            http_client = openai.DefaultHttpxClient(limits=httpx_limits(openai_base_url()))
+            client = openai.OpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+            _openai_clients[api_key] = client
+        return client
+
+
+def close_all():
+    """Cierra todas las sesiones y clientes (las conexiones se vuelven a abrir si se usan)"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        for client in _openai_clients.values():
+            client.close()
+        _sessions.clear()
+        _openai_clients.clear()
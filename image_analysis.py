@@ -0,0 +1,307 @@
+import cv2
+import numpy as np
+
+
+# Mínimo de componentes conexas para considerar fiable una estimación de tamaño de texto
+MIN_GLYPH_COMPONENTS = 20
+
+
+def ink_mask(gray):
+    """Máscara binaria de la tinta (texto oscuro sobre fondo claro = 255)
+
+    Retorna None si la imagen no tiene contraste suficiente para separar tinta
+    y papel, o si parece tener la polaridad invertida (fondo oscuro).
+    """
+    if gray.size == 0 or float(gray.std()) < 5:
+        return None
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if cv2.countNonZero(mask) > mask.size * 0.5:
+        return None
+    return mask
+
+
+def estimate_x_height(gray):
+    """Estima la altura x dominante del texto en píxeles
+
+    Usa las componentes conexas de la máscara de tinta: descarta las que son
+    demasiado pequeñas (ruido) o grandes (líneas, figuras) y toma el percentil
+    30 de las alturas, que corresponde a las minúsculas sin ascendentes.
+    Retorna None si no hay suficiente texto para estimarla.
+    """
+    mask = ink_mask(gray)
+    if mask is None:
+        return None
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]  # Sin el fondo
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    widths = stats[:, cv2.CC_STAT_WIDTH]
+    areas = stats[:, cv2.CC_STAT_AREA]
+
+    h, w = gray.shape[:2]
+    glyphs = (heights >= 2) & (heights <= h * 0.05) & (widths <= w * 0.1) & (areas >= 3)
+    heights = heights[glyphs]
+    if len(heights) < MIN_GLYPH_COMPONENTS:
+        return None
+    return float(np.percentile(heights, 30))
+
+
+# Lado máximo (px) de la miniatura usada para estimar la inclinación
+SKEW_THUMBNAIL_SIDE = 1000
+
+
+def thumbnail(gray, max_side):
+    """Reduce la imagen para que su lado mayor no pase de max_side (retorna (miniatura, escala))"""
+    h, w = gray.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    if scale >= 1.0:
+        return gray, 1.0
+    small = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def _projection_energy(xs, ys, angle, num_bins):
+    """Energía del perfil de proyección horizontal de la tinta girada angle grados"""
+    theta = np.deg2rad(angle)
+    rotated_y = ys * np.cos(theta) - xs * np.sin(theta)
+    rotated_y -= rotated_y.min()
+    bins = np.minimum(rotated_y.astype(np.int32), num_bins - 1)
+    profile = np.bincount(bins, minlength=num_bins).astype(np.float64)
+    return float(np.dot(profile, profile))
+
+
+def estimate_skew_angle(gray, max_angle=10.0):
+    """Estima el ángulo (grados) que hay que girar la página para enderezar sus líneas
+
+    Trabaja sobre una miniatura (lado mayor SKEW_THUMBNAIL_SIDE) y solo con los
+    píxeles de tinta: prueba ángulos entre -max_angle y max_angle y se queda
+    con el que concentra la tinta en menos filas (perfil de proyección más
+    marcado), primero cada 0.5° y después afinando cada 0.1°. La memoria y el
+    tiempo están acotados por el tamaño de la miniatura, no por el de la
+    página. El resultado se usa directamente con cv2.getRotationMatrix2D.
+    Retorna 0.0 si no hay tinta suficiente.
+    """
+    small, _ = thumbnail(gray, SKEW_THUMBNAIL_SIDE)
+    mask = ink_mask(small)
+    if mask is None:
+        return 0.0
+    ys, xs = np.nonzero(mask)
+    if len(ys) < 100:
+        return 0.0
+
+    # Coordenadas centradas para que el giro sea respecto al centro de la página
+    xs = xs.astype(np.float32) - small.shape[1] / 2
+    ys = ys.astype(np.float32) - small.shape[0] / 2
+    num_bins = int(np.hypot(*small.shape[:2])) + 1
+
+    def best_angle(candidates):
+        return max(candidates, key=lambda angle: _projection_energy(xs, ys, angle, num_bins))
+
+    coarse = best_angle(np.arange(-max_angle, max_angle + 0.25, 0.5))
+    fine = best_angle(np.arange(coarse - 0.5, coarse + 0.55, 0.1))
+    return round(float(fine), 2) + 0.0  # Sin -0.0
+
+
+# Lado máximo (px) de la miniatura usada para localizar el contenido
+CONTENT_THUMBNAIL_SIDE = 1000
+# Fila o columna del borde con más de esta fracción de tinta: borde oscuro del escáner
+SCANNER_BORDER_FILL = 0.5
+# Fracción mínima de tinta para que una fila o columna cuente como contenido (y no polvo)
+CONTENT_MIN_FILL = 0.002
+
+
+def _trim_dark_borders(fill):
+    """Índices [inicio, fin) que quedan tras quitar las bandas oscuras de los extremos"""
+    start, end = 0, len(fill)
+    while start < end and fill[start] > SCANNER_BORDER_FILL:
+        start += 1
+    while end > start and fill[end - 1] > SCANNER_BORDER_FILL:
+        end -= 1
+    return start, end
+
+
+def content_bbox(gray):
+    """Rectángulo (izquierda, arriba, derecha, abajo) que contiene la tinta de la página
+
+    Trabaja sobre una miniatura: primero descarta las bandas oscuras que deja
+    el escáner en los bordes y después busca las filas y columnas con tinta
+    suficiente, ignorando motas de polvo sueltas. Retorna None si la página
+    no tiene contenido distinguible del fondo.
+    """
+    small, scale = thumbnail(gray, CONTENT_THUMBNAIL_SIDE)
+    if small.size == 0 or float(small.std()) < 5:
+        return None
+    _, mask = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    top, bottom = _trim_dark_borders(mask.mean(axis=1))
+    left, right = _trim_dark_borders(mask.mean(axis=0))
+    inner = mask[top:bottom, left:right]
+    if inner.size == 0:
+        return None
+    rows = np.nonzero(inner.mean(axis=1) > CONTENT_MIN_FILL)[0]
+    cols = np.nonzero(inner.mean(axis=0) > CONTENT_MIN_FILL)[0]
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+
+    h, w = gray.shape[:2]
+    return (
+        int((left + cols[0]) / scale),
+        int((top + rows[0]) / scale),
+        min(w, int(np.ceil((left + cols[-1] + 1) / scale))),
+        min(h, int(np.ceil((top + rows[-1] + 1) / scale))),
+    )
+
+
+# Lado máximo (px) de la miniatura usada para las estadísticas de la página
+STATS_THUMBNAIL_SIDE = 800
+# Lado del recorte central a resolución completa usado para medir el ruido
+NOISE_SAMPLE_SIDE = 512
+# Kernel de Immerkær: anula las variaciones suaves de la imagen y deja el ruido
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def estimate_noise(gray):
+    """Estima la desviación típica del ruido (en niveles de gris)
+
+    Filtra un recorte central a resolución completa con el kernel de Immerkær
+    y usa la mediana del valor absoluto de la respuesta, que no se ve afectada
+    por los bordes del texto (ocupan pocos píxeles).
+    """
+    h, w = gray.shape[:2]
+    side = min(NOISE_SAMPLE_SIDE, h, w)
+    top, left = (h - side) // 2, (w - side) // 2
+    sample = gray[top:top + side, left:left + side].astype(np.float32)
+    response = cv2.filter2D(sample, -1, _NOISE_KERNEL)[1:-1, 1:-1]
+    # 1.4826 * mediana = desviación típica gaussiana; 6 = norma del kernel
+    return float(1.4826 * np.median(np.abs(response)) / 6)
+
+
+def analyze_page(gray):
+    """Estadísticas baratas de una página para decidir qué preprocesamiento necesita
+
+    Retorna un diccionario con:
+    - noise: desviación típica estimada del ruido
+    - contrast: diferencia entre los percentiles 2 y 98 de intensidad
+    - bilevel_ratio: fracción de píxeles casi negros o casi blancos
+    - skew: ángulo de corrección en grados (ver estimate_skew_angle)
+    - x_height: altura x del texto en píxeles a resolución completa (None si no se puede estimar)
+    """
+    small, scale = thumbnail(gray, STATS_THUMBNAIL_SIDE)
+    low, high = np.percentile(small, (2, 98))
+    histogram = cv2.calcHist([small], [0], None, [256], [0, 256]).ravel()
+    extremes = histogram[:32].sum() + histogram[224:].sum()
+
+    x_height = estimate_x_height(small)
+    return {
+        "noise": estimate_noise(gray),
+        "contrast": float(high - low),
+        "bilevel_ratio": float(extremes / small.size),
+        "skew": estimate_skew_angle(gray),
+        "x_height": x_height / scale if x_height else None,
+    }
+
+
+# Detección de páginas en blanco: lado máximo (px) de la miniatura
+BLANK_THUMBNAIL_SIDE = 800
+# Diferencia mínima de gris respecto al papel para considerar un píxel tinta
+BLANK_INK_DELTA = 60
+# Diferencia de gris respecto al papel que ya no es papel liso (contenido tenue)
+BLANK_FAINT_DELTA = 20
+# Ventana (px de la miniatura) con la que se estima el fondo local del papel
+BLANK_BACKGROUND_KERNEL = 31
+# Fracción máxima de la página (sin bandas del escáner) que puede no ser papel liso
+BLANK_MAX_NONUNIFORM = 0.01
+# Área mínima (px de la miniatura) de una marca; las menores son polvo o ruido
+BLANK_MIN_MARK_AREA = 4
+# Página con pocas marcas y muy poca tinta: solo un número de página o similar
+BLANK_MAX_INK_RATIO = 0.002
+# Alto máximo (fracción del alto de la página) de cada marca de un número de página
+PAGE_NUMBER_MAX_HEIGHT = 0.025
+# Ancho máximo (fracción del ancho de la página) del grupo de marcas de un número de página
+PAGE_NUMBER_MAX_WIDTH = 0.1
+# Franja superior e inferior (fracción del alto) donde van encabezados y números de página
+BLANK_MARGIN_BAND = 0.12
+# Grosor máximo (fracción del lado) de una banda del escáner pegada al borde
+SCANNER_BAND_MAX_THICKNESS = 0.1
+# Fracción máxima de su rectángulo que rellena un marco oscuro alrededor de la página
+SCANNER_FRAME_MAX_FILL = 0.25
+
+
+def _scanner_bands(stats, w, h):
+    """Componentes que son bandas o marcos del escáner (no contenido)
+
+    Una banda es una franja fina a lo largo de un borde; un marco, una
+    componente que abarca casi toda la página pero solo rellena su
+    contorno. Un bloque oscuro grande (foto, recuadro de portada) que toca
+    un borde no es ninguna de las dos cosas.
+    """
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    cw, ch = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    areas = stats[:, cv2.CC_STAT_AREA]
+    touches_edge = (x == 0) | (y == 0) | (x + cw == w) | (y + ch == h)
+    band = (((cw > w * 0.5) & (ch <= h * SCANNER_BAND_MAX_THICKNESS)) |
+            ((ch > h * 0.5) & (cw <= w * SCANNER_BAND_MAX_THICKNESS)))
+    frame = (cw > w * 0.5) & (ch > h * 0.5) & (areas <= cw * ch * SCANNER_FRAME_MAX_FILL)
+    return touches_edge & (band | frame)
+
+
+def blank_page_reason(gray, max_marks=4):
+    """Indica si la página está en blanco o casi (sin contenido que merezca OCR)
+
+    Sobre una miniatura cuenta las marcas (componentes conexas que se
+    separan del color del papel, más oscuras o más claras: una portada
+    oscura con texto blanco también tiene marcas), descartando el polvo y
+    las bandas y marcos que deja el escáner en los bordes. Retorna None si
+    la página tiene contenido, o un diccionario con:
+    - reason: "blank" (sin marcas y el resto de la página es papel liso) o
+      "few_marks" (solo un número de página: como mucho max_marks marcas
+      de tamaño de cifra juntas en el encabezado o el pie, ver
+      _looks_like_page_number)
+    - marks: número de marcas
+    - ink_ratio: fracción de la página cubierta de tinta
+    """
+    small, _ = thumbnail(gray, BLANK_THUMBNAIL_SIDE)
+    h, w = small.shape[:2]
+    paper = float(np.median(small))
+    diff = np.abs(small.astype(np.int16) - int(paper))
+    ink = (diff > BLANK_INK_DELTA).astype(np.uint8)
+
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    bands = _scanner_bands(stats, w, h)
+    bands[0] = False  # Fondo
+    stats, bands = stats[1:], bands[1:]
+    areas = stats[:, cv2.CC_STAT_AREA]
+    marks = (areas >= BLANK_MIN_MARK_AREA) & ~bands
+
+    count = int(marks.sum())
+    ink_ratio = float(areas[marks].sum()) / small.size
+    if count == 0:
+        # Sin marcas claras: debe ser papel liso salvo las bandas (no un texto
+        # tenue). Se compara con el fondo local para tolerar sombras de escaneo
+        background = cv2.medianBlur(small, BLANK_BACKGROUND_KERNEL)
+        local = np.abs(small.astype(np.int16) - background)
+        band_pixels = np.concatenate(([False], bands))[labels]
+        nonuniform = float(np.count_nonzero((local > BLANK_FAINT_DELTA) & ~band_pixels)) / small.size
+        if nonuniform > BLANK_MAX_NONUNIFORM:
+            return None
+        return {"reason": "blank", "marks": 0, "ink_ratio": ink_ratio}
+    if count <= max_marks and ink_ratio <= BLANK_MAX_INK_RATIO and _looks_like_page_number(stats[marks], w, h):
+        return {"reason": "few_marks", "marks": count, "ink_ratio": ink_ratio}
+    return None
+
+
+def _looks_like_page_number(stats, w, h):
+    """Indica si las marcas (estadísticas de componentes) parecen solo un número de página
+
+    Todas deben tener tamaño de cifra, estar en la franja del encabezado o
+    del pie y juntas en un grupo estrecho, como "12" o "- 3 -". Un título
+    corto ("ANEXO 1") o marcas repartidas por el margen no lo son.
+    """
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    cw, ch = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    if np.any(ch > h * PAGE_NUMBER_MAX_HEIGHT):
+        return False
+    centers = (y + ch / 2) / h
+    if not (np.all(centers < BLANK_MARGIN_BAND) or np.all(centers > 1 - BLANK_MARGIN_BAND)):
+        return False
+    return (x + cw).max() - x.min() <= w * PAGE_NUMBER_MAX_WIDTH
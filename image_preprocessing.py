@@ -0,0 +1,382 @@
+import ast
+import time
+from functools import lru_cache
+import cv2
+import numpy as np
+from config import Config
+from image_analysis import analyze_page, content_bbox, estimate_skew_angle
+
+
+# Preprocesamiento adaptativo: inclinación mínima (grados) que merece enderezar la página
+DESKEW_MIN_ANGLE = 0.5
+# Página ya en blanco y negro: fracción de píxeles extremos y contraste mínimos
+CLEAN_BILEVEL_RATIO = 0.9
+CLEAN_MIN_CONTRAST = 150
+# Por debajo de este factor no compensa escalar la página
+MIN_UPSCALE_FACTOR = 1.1
+
+# Registro de etapas: nombre -> {"function", "label", "needed"}
+STAGES = {}
+
+
+def register_stage(name, label, needed=None):
+    """Decorador que registra una etapa de preprocesamiento
+
+    La función recibe (imagen, contexto, **parámetros) y retorna la imagen
+    procesada; trabaja con arrays completos de OpenCV/NumPy, sin bucles por
+    píxel. needed(imagen, contexto, **parámetros) decide, con
+    ADAPTIVE_PREPROCESSING, si la página necesita la etapa (None = siempre).
+    """
+    def decorator(function):
+        STAGES[name] = {"function": function, "label": label, "needed": needed}
+        return function
+    return decorator
+
+
+def parse_pipeline(spec):
+    """Convierte la descripción textual del pipeline en una lista de (etapa, parámetros)
+
+    Formato: etapas separadas por comas, cada una con parámetros opcionales
+    entre paréntesis, p. ej. "grayscale,denoise(h=12),threshold(method=adaptive)".
+    """
+    return list(_parse_pipeline(spec))
+
+
+@lru_cache(maxsize=8)
+def _parse_pipeline(spec):
+    stages = []
+    for item in _split_top_level(spec):
+        name, _, args = item.partition("(")
+        name = name.strip()
+        if name not in STAGES:
+            raise Exception(f"Etapa de preprocesamiento desconocida: {name}")
+        params = {}
+        args = args.rstrip(")").strip()
+        for arg in _split_top_level(args):
+            key, sep, value = arg.partition("=")
+            if not sep:
+                raise Exception(f"Parámetro inválido en la etapa {name}: {arg}")
+            try:
+                params[key.strip()] = ast.literal_eval(value.strip())
+            except (ValueError, SyntaxError):
+                params[key.strip()] = value.strip()
+        stages.append((name, params))
+    return tuple(stages)
+
+
+def _split_top_level(text):
+    """Divide por comas que no estén dentro de paréntesis"""
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def enhance_page(page, pipeline=None):
+    """Preprocesa un PageImage para OCR en memoria (ver PDFProcessor.enhance_image_for_ocr)
+
+    Ejecuta en orden las etapas de pipeline (por defecto
+    Config.PREPROCESSING_PIPELINE). Con ADAPTIVE_PREPROCESSING se salta las
+    que la página no necesita según sus estadísticas. Las etapas ejecutadas
+    y su duración quedan en page.metadata["preprocessing"].
+
+    Es una función de módulo para poder ejecutarla en un pool de procesos.
+    Si algo falla retorna la página sin preprocesar.
+    """
+    try:
+        print(f"[INFO] Preprocesando imagen: {page.name}")
+        stages = parse_pipeline(pipeline or Config.PREPROCESSING_PIPELINE)
+        context = {
+            "page": page,
+            "adaptive": Config.ADAPTIVE_PREPROCESSING,
+            "stats": None,
+            "scale": 1.0,  # Escala acumulada respecto a la página original
+            "bilevel": False,
+            "timings": [],
+        }
+
+        image = page.array
+        skipped = []
+        for name, params in stages:
+            stage = STAGES[name]
+            if context["adaptive"] and stage["needed"] and not stage["needed"](image, context, **params):
+                skipped.append(name)
+                continue
+            print(f"  - {stage['label']}...")
+            image = _run_stage(context, name, stage["function"], image, context, **params)
+
+        page.replace_array(image)
+        page.metadata["enhanced"] = True
+        page.metadata["bilevel"] = context["bilevel"]
+        page.metadata["preprocessing"] = {
+            "adaptive": context["adaptive"],
+            "stats": context["stats"],
+            "stages": context["timings"],
+            "skipped": skipped,
+            "seconds": sum(stage["seconds"] for stage in context["timings"]),
+        }
+        timings = ", ".join(f"{stage['stage']} {stage['seconds']:.2f}s" for stage in context["timings"])
+        print(f"  ✓ Imagen preprocesada: {image.shape[1]}x{image.shape[0]}px ({timings})")
+        return page
+
+    except Exception as e:
+        print(f"[ERROR] Error en preprocesamiento: {str(e)}")
+        print(f"  Usando imagen original sin preprocesar")
+        return page
+
+
+def _run_stage(context, name, function, *args, **kwargs):
+    """Ejecuta una etapa de preprocesamiento y anota cuánto tardó
+
+    Si la etapa dispara el análisis de la página, ese tiempo se anota aparte
+    y no se cuenta dos veces.
+    """
+    timings = context["timings"]
+    nested = len(timings)
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start - sum(t["seconds"] for t in timings[nested:])
+    timings.append({"stage": name, "seconds": seconds})
+    return result
+
+
+def page_stats(image, context):
+    """Estadísticas de la página (analyze_page), calculadas una sola vez por página
+
+    Se miden sobre la imagen en escala de grises tal como está cuando una
+    etapa las pide por primera vez; x_height se corrige después con la
+    escala acumulada (ver current_x_height).
+    """
+    if context["stats"] is None:
+        stats = _run_stage(context, "analyze", analyze_page, _as_gray(image))
+        stats["scale"] = context["scale"]
+        context["stats"] = stats
+        x_height = f"{stats['x_height']:.0f}px" if stats["x_height"] else "?"
+        print(f"  Ruido {stats['noise']:.1f}, contraste {stats['contrast']:.0f}, "
+              f"inclinación {stats['skew']:.2f}°, altura x {x_height}")
+    return context["stats"]
+
+
+def current_x_height(image, context):
+    """Altura x del texto en píxeles de la imagen actual (None si no se puede estimar)"""
+    stats = page_stats(image, context)
+    if not stats["x_height"]:
+        return None
+    return stats["x_height"] * context["scale"] / stats["scale"]
+
+
+def _as_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+def _resize(image, context, scale, interpolation):
+    h, w = image.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    context["scale"] *= scale
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+# Etapas registradas
+
+@register_stage("grayscale", "Convirtiendo a escala de grises")
+def grayscale(image, context):
+    return _as_gray(image)
+
+
+def _crop_needed(image, context, **params):
+    # Los recortes de regiones de páginas mixtas ya se ajustan a su imagen
+    return not context["page"].metadata.get("region")
+
+
+@register_stage("crop_to_content", "Recortando márgenes", needed=_crop_needed)
+def crop_to_content(image, context, pad=16, min_saving=0.05):
+    """Recorta los márgenes en blanco y los bordes del escáner, dejando pad píxeles de margen
+
+    Si la página se va a enderezar, el margen crece lo que giran las
+    esquinas del contenido, para no cortar texto. Solo recorta si ahorra al
+    menos min_saving de los píxeles. El rectángulo recortado queda en
+    page.metadata["crop"] en píxeles de la página renderizada.
+    """
+    box = content_bbox(_as_gray(image))
+    if box is None:
+        return image
+    left, top, right, bottom = box
+
+    # La inclinación se mide sobre el contenido: los bordes del escáner la falsean
+    angle = estimate_skew_angle(image[top:bottom, left:right])
+    if abs(angle) > DESKEW_MIN_ANGLE:
+        pad += int(np.ceil(abs(np.deg2rad(angle)) * np.hypot(right - left, bottom - top) / 2))
+    height, width = image.shape[:2]
+    left, top = max(0, left - pad), max(0, top - pad)
+    right, bottom = min(width, right + pad), min(height, bottom + pad)
+
+    if (right - left) * (bottom - top) > (1 - min_saving) * width * height:
+        return image
+    scale = context["scale"]
+    context["page"].metadata["crop"] = {
+        "left": int(left / scale),
+        "top": int(top / scale),
+        "right": int(right / scale),
+        "bottom": int(bottom / scale),
+        "saved_ratio": 1 - (right - left) * (bottom - top) / (width * height),
+    }
+    return image[top:bottom, left:right].copy()
+
+
+def _downscale_factor(image, context, target=None, max_side=None):
+    """Factor (< 1) para reducir la página sin que el texto baje de la altura x objetivo"""
+    factor = 1.0
+    if max_side:
+        factor = min(factor, max_side / max(image.shape[:2]))
+    x_height = current_x_height(image, context)
+    target = target or Config.TARGET_X_HEIGHT_PX
+    if x_height and x_height > target * MIN_UPSCALE_FACTOR:
+        factor = min(factor, target / x_height)
+    return factor
+
+
+def _downscale_needed(image, context, **params):
+    return _downscale_factor(image, context, **params) < 1.0
+
+
+@register_stage("downscale", "Reduciendo resolución", needed=_downscale_needed)
+def downscale(image, context, target=None, max_side=None):
+    """Reduce la página (INTER_AREA) si el texto es más grande de lo necesario
+
+    Al ir antes de la eliminación de ruido y del enderezado, ambas etapas
+    trabajan con menos píxeles. max_side limita además el lado mayor.
+    """
+    factor = _downscale_factor(image, context, target, max_side)
+    if factor >= 1.0:
+        return image
+    return _resize(image, context, factor, cv2.INTER_AREA)
+
+
+def _denoise_needed(image, context, **params):
+    stats = page_stats(image, context)
+    # Reducir la página promedia píxeles y también reduce el ruido
+    noise = stats["noise"] * min(1.0, context["scale"] / stats["scale"])
+    return noise >= Config.DENOISE_NOISE_THRESHOLD
+
+
+@register_stage("denoise", "Eliminando ruido", needed=_denoise_needed)
+def denoise(image, context, h=10, template=7, search=21):
+    """Eliminación de ruido con fastNlMeansDenoising (la etapa más costosa)"""
+    return cv2.fastNlMeansDenoising(image, None, h, template, search)
+
+
+def _deskew_needed(image, context, min_angle=DESKEW_MIN_ANGLE, **params):
+    return abs(page_stats(image, context)["skew"]) > min_angle
+
+
+@register_stage("deskew", "Enderezando página", needed=_deskew_needed)
+def deskew(image, context, min_angle=DESKEW_MIN_ANGLE, max_angle=10.0):
+    """Endereza la página con perfiles de proyección de la tinta sobre una miniatura"""
+    if context["stats"] is not None:
+        angle = context["stats"]["skew"]
+    else:
+        angle = estimate_skew_angle(image, max_angle)
+
+    # Solo corregir si el ángulo es significativo
+    if abs(angle) <= min_angle:
+        return image
+    print(f"    Ángulo detectado: {angle:.2f}°")
+    (h, w) = image.shape[:2]
+    center = (w // 2, h // 2)
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(image, M, (w, h),
+                          flags=cv2.INTER_CUBIC,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+def _upscale_factor(image, context, factor=None):
+    """Factor de escalado para texto pequeño (1.0 = no escalar)"""
+    # Con DPI adaptativo la página ya tiene el tamaño de texto objetivo
+    if context["page"].metadata.get("adaptive_dpi"):
+        return 1.0
+    factor = factor or Config.IMAGE_SCALE_FACTOR
+    if context["adaptive"]:
+        # Escalar solo lo necesario para que el texto llegue a la altura x
+        # objetivo (si no se puede medir, no hay texto que justifique escalar)
+        x_height = current_x_height(image, context)
+        factor = min(factor, Config.TARGET_X_HEIGHT_PX / x_height) if x_height else 1.0
+        if factor < MIN_UPSCALE_FACTOR:
+            return 1.0
+    return max(1.0, factor)
+
+
+def _upscale_needed(image, context, **params):
+    return _upscale_factor(image, context, **params) > 1.0
+
+
+@register_stage("upscale", "Escalando imagen", needed=_upscale_needed)
+def upscale(image, context, factor=None):
+    """Escalado cúbico para mejorar texto pequeño
+
+    Va antes de la binarización: escalar los grises conserva la forma de los
+    trazos, mientras que escalar una imagen ya binarizada solo agranda los
+    píxeles y obliga a volver a binarizar.
+    """
+    factor = _upscale_factor(image, context, factor)
+    if factor <= 1.0:
+        return image
+    return _resize(image, context, factor, cv2.INTER_CUBIC)
+
+
+@register_stage("threshold", "Aplicando binarización")
+def threshold(image, context, method="auto", block_size=11, c=2):
+    """Binarización: adaptativa (mejor para iluminación irregular), global u Otsu
+
+    method="auto" usa umbral global si la página ya es prácticamente blanco
+    y negro con buen contraste, y adaptativa en el resto de casos.
+    """
+    image = _as_gray(image)
+    if method == "auto":
+        method = "adaptive"
+        if context["adaptive"]:
+            stats = page_stats(image, context)
+            if stats["bilevel_ratio"] >= CLEAN_BILEVEL_RATIO and stats["contrast"] >= CLEAN_MIN_CONTRAST:
+                method = "global"
+
+    if method == "adaptive":
+        binary = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, block_size, c)
+    elif method == "otsu":
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    elif method == "global":
+        _, binary = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY)
+    else:
+        raise Exception(f"Método de binarización desconocido: {method}")
+    context["bilevel"] = True
+    return binary
+
+
+def _cleanup_needed(image, context, **params):
+    return context["bilevel"] and page_stats(image, context)["noise"] >= Config.DENOISE_NOISE_THRESHOLD
+
+
+@register_stage("morph_cleanup", "Eliminando motas", needed=_cleanup_needed)
+def morph_cleanup(image, context, min_area=4):
+    """Elimina motas aisladas de la imagen binarizada
+
+    Borra las componentes conexas de tinta de menos de min_area píxeles
+    (puntos de ruido que sobreviven a la binarización). Solo actúa sobre
+    imágenes ya binarizadas.
+    """
+    if not context["bilevel"]:
+        return image
+    ink = cv2.bitwise_not(image)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    specks = stats[:, cv2.CC_STAT_AREA] < min_area
+    specks[0] = False  # Fondo
+    cleaned = image.copy()
+    cleaned[specks[labels]] = 255
+    return cleaned
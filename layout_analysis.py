@@ -0,0 +1,170 @@
+import cv2
+import numpy as np
+from image_analysis import ink_mask, thumbnail, estimate_x_height
+from page_image import PageImage
+
+
+# Lado máximo (px) de la miniatura sobre la que se buscan los bloques de texto
+LAYOUT_THUMBNAIL_SIDE = 1600
+# Altura x supuesta (px de la miniatura) si no se puede estimar
+DEFAULT_X_HEIGHT = 8
+# Componentes más altas que este múltiplo de la altura x: fotos, logos, líneas o marcos
+MAX_GLYPH_HEIGHT = 4
+# Fracción mínima de componentes con tamaño de carácter para que un bloque sea texto
+MIN_GLYPH_FRACTION = 0.5
+# Por debajo de estas componentes un bloque es un texto corto (una cifra, una
+# marca de casilla, un código): se conserva si todas tienen tamaño de carácter
+MIN_BLOCK_COMPONENTS = 3
+# Dilatación en múltiplos de la altura x: horizontal une las letras de una línea,
+# vertical une las líneas de un párrafo
+DILATE_WIDTH = 2.0
+DILATE_HEIGHT = 2.0
+# Separación mínima (múltiplos de la altura x) para partir la página en columnas o filas
+MIN_CUT_GAP = 1.0
+# Separación (px) entre bloques al unirlos en una sola imagen
+BLOCK_GAP = 40
+
+
+def _glyph_mask(mask, x_height):
+    """Máscara solo con las componentes de tamaño de carácter, y cuáles son
+
+    Las componentes muy altas (fotos, logos, marcos, líneas de tabla) se
+    quitan antes de dilatar para que no unan bloques de texto distintos.
+    Retorna (máscara, etiquetas, estadísticas, es_glifo).
+    """
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    widths = stats[:, cv2.CC_STAT_WIDTH]
+    glyphs = (heights <= x_height * MAX_GLYPH_HEIGHT) & (widths <= x_height * MAX_GLYPH_HEIGHT * 4)
+    glyphs &= (stats[:, cv2.CC_STAT_AREA] >= 2)
+    glyphs[0] = False  # Fondo
+    return (glyphs[labels] * 255).astype(np.uint8), labels, stats, glyphs
+
+
+def _is_text_block(labels, stats, glyphs, box, x_height):
+    """Indica si las componentes de box parecen texto (de tamaño de carácter)
+
+    Los bloques de pocas componentes (un "1" en una columna de cantidades,
+    la "X" de una casilla) se conservan si todas tienen tamaño de carácter;
+    el polvo y las motas quedan fuera por ser más bajos que media altura x.
+    """
+    x0, y0, x1, y1 = box
+    inside = np.unique(labels[y0:y1, x0:x1])
+    inside = inside[inside > 0]
+    if len(inside) == 0:
+        return False
+    heights = stats[inside, cv2.CC_STAT_HEIGHT]
+    sized = glyphs[inside] & (heights >= x_height * 0.5)
+    if len(inside) < MIN_BLOCK_COMPONENTS:
+        return bool(sized.all())
+    return sized.mean() >= MIN_GLYPH_FRACTION
+
+
+def _cut(boxes, axis, min_gap):
+    """Agrupa las cajas por los huecos de al menos min_gap a lo largo de axis (0 = x, 1 = y)"""
+    order = sorted(boxes, key=lambda box: box[axis])
+    groups = [[order[0]]]
+    end = order[0][axis + 2]
+    for box in order[1:]:
+        if box[axis] - end >= min_gap:
+            groups.append([])
+        groups[-1].append(box)
+        end = max(end, box[axis + 2])
+    return groups
+
+
+def reading_order(boxes, min_gap=0):
+    """Ordena las cajas (x0, y0, x1, y1) en orden de lectura con cortes XY recursivos
+
+    Se parte la página por los huecos horizontales de lado a lado (bandas
+    de arriba abajo) y cada banda por los huecos verticales (columnas de
+    izquierda a derecha), recursivamente hasta que no quedan huecos. Así
+    un texto a dos columnas se lee columna a columna y un título a todo el
+    ancho va antes que las columnas que tiene debajo.
+    """
+    if len(boxes) <= 1:
+        return list(boxes)
+    for axis in (1, 0):
+        groups = _cut(boxes, axis, min_gap)
+        if len(groups) > 1:
+            return [box for group in groups for box in reading_order(group, min_gap)]
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def text_blocks(gray):
+    """Bloques de texto de una página en orden de lectura
+
+    Sobre una miniatura binarizada (lado mayor LAYOUT_THUMBNAIL_SIDE) se
+    quitan las componentes que no tienen tamaño de carácter, se dilata la
+    tinta en proporción a la altura x para unir letras en líneas y líneas
+    en párrafos, y cada contorno resultante es un bloque candidato. Se
+    descartan los bloques cuyas componentes no parecen texto (restos de
+    fotos o tramas). Retorna una lista de (x0, y0, x1, y1) en píxeles de la
+    página, o [] si no hay tinta distinguible.
+    """
+    small, scale = thumbnail(gray, LAYOUT_THUMBNAIL_SIDE)
+    mask = ink_mask(small)
+    if mask is None:
+        return []
+    x_height = estimate_x_height(small) or DEFAULT_X_HEIGHT
+
+    glyph_mask, labels, stats, glyphs = _glyph_mask(mask, x_height)
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(1, int(x_height * DILATE_WIDTH)), max(1, int(x_height * DILATE_HEIGHT)))
+    )
+    joined = cv2.dilate(glyph_mask, kernel)
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        box = (x, y, x + w, y + h)
+        if _is_text_block(labels, stats, glyphs, box, x_height):
+            boxes.append(box)
+
+    h, w = gray.shape[:2]
+    pad = x_height / 2  # La dilatación ya deja margen; medio carácter más por seguridad
+    blocks = [
+        (max(0, int((x0 - pad) / scale)), max(0, int((y0 - pad) / scale)),
+         min(w, int(np.ceil((x1 + pad) / scale))), min(h, int(np.ceil((y1 + pad) / scale))))
+        for x0, y0, x1, y1 in boxes
+    ]
+    return reading_order(blocks, MIN_CUT_GAP * x_height / scale)
+
+
+def block_coverage(blocks, width, height):
+    """Fracción de la página que ocupan los bloques"""
+    return sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in blocks) / float(width * height)
+
+
+def crop_blocks(page, blocks):
+    """Recortes de los bloques (vistas del array de la página, sin copiar)"""
+    return [
+        PageImage(page.array[y0:y1, x0:x1], index=page.index,
+                  metadata=dict(page.metadata, block=(x0, y0, x1, y1)))
+        for x0, y0, x1, y1 in blocks
+    ]
+
+
+def compose_blocks(page, blocks, gap=BLOCK_GAP):
+    """Une los bloques en una sola imagen, uno debajo de otro en orden de lectura
+
+    Cada bloque se alinea a la izquierda sobre fondo blanco, separado del
+    siguiente por gap píxeles. La imagen tiene el ancho del bloque más
+    ancho, así que con varias columnas queda más alta y estrecha que la
+    página pero con muchos menos píxeles que no son texto.
+    """
+    width = max(x1 - x0 for x0, _, x1, _ in blocks)
+    height = sum(y1 - y0 for _, y0, _, y1 in blocks) + gap * (len(blocks) - 1)
+    shape = (height, width) + page.array.shape[2:]
+    canvas = np.full(shape, 255, dtype=page.array.dtype)
+    y = 0
+    for x0, y0, x1, y1 in blocks:
+        canvas[y:y + y1 - y0, :x1 - x0] = page.array[y0:y1, x0:x1]
+        y += y1 - y0 + gap
+    metadata = dict(page.metadata, layout={
+        "blocks": [list(block) for block in blocks],
+        "coverage": round(block_coverage(blocks, page.width, page.height), 3),
+    })
+    return PageImage(canvas, index=page.index, metadata=metadata)
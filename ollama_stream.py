@@ -0,0 +1,184 @@
+import json
+import re
+import time
+from resilience import BackendError
+
+
+# Longitud máxima (caracteres) del fragmento que se repite en un bucle del modelo
+MAX_LOOP_UNIT = 300
+# Caracteres nuevos entre dos comprobaciones de repetición
+LOOP_CHECK_INTERVAL = 200
+# Caracteres mínimos que debe ocupar la repetición para ser un bucle: una tabla
+# real con filas iguales (100 filas de ceros son unos 2300 caracteres) se queda
+# por debajo, mientras que un modelo en bucle sigue repitiendo hasta num_predict
+# (4096 tokens, unos 12000 caracteres)
+MIN_LOOP_CHARS = 4000
+# Fracción del límite de la respuesta (max_chars) que debe ocupar como mínimo un bucle
+MIN_LOOP_SHARE = 1 / 3
+
+
+def repetition_start(text, min_repeats, min_chars=MIN_LOOP_CHARS):
+    """Posición donde empieza un bucle de repetición al final de text (None si no hay)
+
+    Un bucle es un mismo fragmento (una línea, varias líneas o unas pocas
+    palabras, de hasta MAX_LOOP_UNIT caracteres) repetido al menos
+    min_repeats veces seguidas al final del texto y ocupando al menos
+    min_chars caracteres. El fragmento debe contener letras o números: las
+    líneas de puntos o guiones de índices y tablas no cuentan. Retorna la
+    posición de la segunda copia, así text[:posición] conserva una.
+    """
+    if min_repeats < 2:
+        return None
+    # Se comprueba cada LOOP_CHECK_INTERVAL caracteres, así que basta mirar el
+    # final donde caben min_repeats copias del fragmento más largo
+    offset = max(0, len(text) - MAX_LOOP_UNIT * min_repeats - LOOP_CHECK_INTERVAL)
+    tail = text[offset:]
+    pattern = r"(.{4,%d}?)\1{%d,}\s*\Z" % (MAX_LOOP_UNIT, min_repeats - 1)
+    match = re.search(pattern, tail, re.DOTALL)
+    if match is None or not re.search(r"\w", match.group(1)):
+        return None
+
+    # Las copias pueden seguir antes del final examinado: contarlas todas
+    unit = match.group(1)
+    start = offset + match.start()
+    while start >= len(unit) and text.startswith(unit, start - len(unit)):
+        start -= len(unit)
+    if offset + match.end() - start < min_chars:
+        return None
+    return start + len(unit)
+
+
+# Motivos de fin con los que el texto puede estar incompleto
+TRUNCATION_REASONS = ("repetition", "max_length")
+
+
+def combine_stats(stats_list):
+    """Métricas de una página a partir de las de sus generaciones (piezas, bloques, regiones)
+
+    Con una sola generación son sus métricas. Con varias: "seconds" y
+    "tokens" son la suma (tiempo de modelo, no de reloj, porque pueden ir en
+    paralelo), "first_token_seconds" el peor, "tokens_per_second" la media
+    ponderada por tokens, "stop_reason" el primer motivo de corte (o
+    "done") y "parts" el número de generaciones. Retorna None si no hay
+    ninguna.
+    """
+    if not stats_list:
+        return None
+    if len(stats_list) == 1:
+        return dict(stats_list[0])
+    first_tokens = [s["first_token_seconds"] for s in stats_list if s["first_token_seconds"] is not None]
+    rated = [(s["tokens"], s["tokens_per_second"]) for s in stats_list if s["tokens"] and s["tokens_per_second"]]
+    generation_seconds = sum(tokens / rate for tokens, rate in rated)
+    return {
+        "first_token_seconds": max(first_tokens) if first_tokens else None,
+        "seconds": round(sum(s["seconds"] for s in stats_list), 3),
+        "tokens": sum(s["tokens"] or 0 for s in stats_list),
+        "tokens_per_second": (round(sum(tokens for tokens, _ in rated) / generation_seconds, 1)
+                              if generation_seconds else None),
+        "stop_reason": next((s["stop_reason"] for s in stats_list if s["stop_reason"] in TRUNCATION_REASONS),
+                            "done"),
+        "parts": len(stats_list),
+    }
+
+
+class StreamCollector:
+    """Acumula la respuesta en streaming de Ollama (NDJSON) y decide cuándo cortarla
+
+    Cada línea del stream se pasa a feed(), que retorna False si hay que
+    dejar de leer: el modelo terminó, el texto supera max_chars o ha
+    entrado en un bucle repitiendo el mismo fragmento al menos max_repeats
+    veces y ocupando al menos MIN_LOOP_CHARS caracteres o un tercio de
+    max_chars, lo que sea mayor (ver repetition_start).
+    Al cerrar la conexión Ollama deja de generar, así no se pagan los
+    tokens restantes hasta num_predict. on_text(texto_parcial) se llama
+    con el texto acumulado tras cada fragmento.
+
+    Tras leer el stream:
+    - text: texto generado (sin las copias del bucle si se cortó por repetición)
+    - stop_reason: "done", "repetition", "max_length" o None (stream incompleto)
+    - done_reason: motivo de fin que indica Ollama
+    - stats(): tiempo hasta el primer token, tokens y tokens por segundo
+    """
+
+    def __init__(self, on_text=None, max_chars=0, max_repeats=0):
+        self.on_text = on_text
+        self.max_chars = max_chars
+        self.max_repeats = max_repeats
+        self.min_loop_chars = max(MIN_LOOP_CHARS, int(max_chars * MIN_LOOP_SHARE))
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.eval_count = None
+        self.eval_duration = None
+        self.done_reason = None
+        self.stop_reason = None
+        self._parts = []
+        self._length = 0
+        self._checked_at = 0
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def feed(self, line):
+        """Procesa una línea del stream; retorna False si hay que dejar de leer"""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            return True
+        chunk = json.loads(line)
+        if "error" in chunk:
+            # Error a mitad de la generación (p. ej. el modelo se descargó): pasajero
+            raise BackendError(f"Error en Ollama: {chunk['error']}", transient=True)
+
+        token = chunk.get("response", "")
+        if token:
+            if self.first_token_at is None:
+                self.first_token_at = time.monotonic()
+            self.tokens += 1
+            self._parts.append(token)
+            self._length += len(token)
+            if self.on_text is not None:
+                self.on_text(self.text)
+
+        if chunk.get("done"):
+            self.eval_count = chunk.get("eval_count")
+            self.eval_duration = chunk.get("eval_duration")
+            self.done_reason = chunk.get("done_reason")
+            return self._stop("done")
+        if self.max_chars and self._length >= self.max_chars:
+            return self._stop("max_length")
+        if self.max_repeats and self._length - self._checked_at >= LOOP_CHECK_INTERVAL:
+            self._checked_at = self._length
+            text = self.text
+            start = repetition_start(text, self.max_repeats, self.min_loop_chars)
+            if start is not None:
+                self._parts = [text[:start]]
+                self._length = start
+                return self._stop("repetition")
+        return True
+
+    def _stop(self, reason):
+        self.stop_reason = reason
+        self.finished_at = time.monotonic()
+        return False
+
+    def stats(self):
+        """Métricas de la generación (segundos y tokens por segundo)"""
+        end = self.finished_at or time.monotonic()
+        first_token = self.first_token_at - self.started if self.first_token_at else None
+        if self.eval_count and self.eval_duration:
+            # Ollama informa de la duración de la generación en nanosegundos
+            rate = self.eval_count / (self.eval_duration / 1e9)
+        elif self.first_token_at and end > self.first_token_at:
+            rate = (self.tokens - 1) / (end - self.first_token_at)
+        else:
+            rate = None
+        return {
+            "first_token_seconds": round(first_token, 3) if first_token is not None else None,
+            "seconds": round(end - self.started, 3),
+            "tokens": self.eval_count or self.tokens,
+            "tokens_per_second": round(rate, 1) if rate else None,
+            "stop_reason": self.stop_reason,
+        }
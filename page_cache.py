@@ -0,0 +1,307 @@
+import sqlite3
+import threading
+import time
+import zlib
+import cv2
+import numpy as np
+from image_analysis import thumbnail, estimate_x_height
+
+
+# Altura x (px) a la que se reduce la página para verificar candidatos: a esta
+# escala el trazo que distingue un 0 de un 8 ocupa varios píxeles
+VERIFY_X_HEIGHT = 16
+# Lado mayor máximo (px) de la página binarizada que se guarda para verificar
+VERIFY_MAX_SIDE = 3400
+# Lado mayor (px) de la versión reducida con la que se estima el desplazamiento
+ALIGN_SIDE = 800
+# Píxeles alrededor del desplazamiento estimado que se prueban a tamaño completo
+ALIGN_REFINE = 2
+# Desplazamiento máximo (fracción del lado mayor) que se compensa al alinear dos páginas
+VERIFY_MAX_SHIFT = 0.005
+# Píxeles de tinta que solo están en una de las páginas (lejos de cualquier trazo
+# de la otra) a partir de los cuales una zona es un cambio de contenido
+VERIFY_MIN_CLUSTER = 3
+# Diferencia máxima de proporción ancho/alto entre dos páginas iguales
+MAX_ASPECT_DIFFERENCE = 0.02
+# Bits distintos máximos entre los pHash de dos candidatos
+MAX_HASH_DISTANCE = 6
+# El hash de 64 bits se divide en bandas: dos páginas con pocos bits distintos
+# coinciden exactamente en al menos una banda, que se usa como clave de búsqueda
+HASH_BANDS = 4
+BAND_BITS = 64 // HASH_BANDS
+# Páginas guardadas entre dos limpiezas de la base de datos (caducadas y sobrantes)
+PRUNE_EVERY = 100
+
+
+def phash(gray):
+    """Hash perceptual de 64 bits (DCT de la miniatura de 32x32)"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # Sin el coeficiente de continua
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def dhash(gray):
+    """Hash de diferencias de 64 bits (gradiente horizontal de una miniatura de 9x8)"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * i)) & mask for i in range(HASH_BANDS)]
+
+
+def _signed(value):
+    """Entero de 64 bits sin signo -> con signo (SQLite solo guarda enteros con signo)"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def fingerprint(gray):
+    """Huella de una página: hashes, proporción y página binarizada para verificar
+
+    La página se reduce hasta que su texto tiene una altura x de
+    VERIFY_X_HEIGHT px (nunca se amplía) y se guarda empaquetada a 1 bit y
+    comprimida (unos 20-60KB).
+    """
+    h, w = gray.shape[:2]
+    small, _ = thumbnail(gray, VERIFY_MAX_SIDE)
+    x_height = estimate_x_height(small)
+    if x_height and x_height > VERIFY_X_HEIGHT:
+        scale = VERIFY_X_HEIGHT / x_height
+        size = (max(1, round(small.shape[1] * scale)), max(1, round(small.shape[0] * scale)))
+        small = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return {
+        "phash": phash(gray),
+        "dhash": dhash(gray),
+        "aspect": w / h,
+        "thumb": _pack_thumb(ink),
+    }
+
+
+def _pack_thumb(ink):
+    h, w = ink.shape
+    return h.to_bytes(4, "little") + w.to_bytes(4, "little") + zlib.compress(np.packbits(ink).tobytes())
+
+
+def _unpack_thumb(data):
+    h, w = int.from_bytes(data[:4], "little"), int.from_bytes(data[4:8], "little")
+    bits = np.unpackbits(np.frombuffer(zlib.decompress(data[8:]), dtype=np.uint8))
+    return bits[:h * w].reshape(h, w)
+
+
+def _align(a, b):
+    """Desplaza b para alinearlo con a; retorna None si el desplazamiento es excesivo
+
+    El desplazamiento se estima con correlación de fase sobre versiones
+    reducidas (a tamaño completo tarda casi medio segundo) y se afina
+    probando los desplazamientos vecinos a tamaño completo.
+    """
+    if b.shape != a.shape:
+        b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_NEAREST)
+    small_a, scale = thumbnail(a.astype(np.float32), ALIGN_SIDE)
+    small_b, _ = thumbnail(b.astype(np.float32), ALIGN_SIDE)
+    (dx, dy), _ = cv2.phaseCorrelate(small_a, small_b)
+    dx, dy = round(dx / scale), round(dy / scale)
+    if max(abs(dx), abs(dy)) > VERIFY_MAX_SHIFT * max(a.shape) + 1 / scale:
+        return None
+
+    best, best_count = None, None
+    for ry in range(-ALIGN_REFINE, ALIGN_REFINE + 1):
+        for rx in range(-ALIGN_REFINE, ALIGN_REFINE + 1):
+            shift = np.float32([[1, 0, -(dx + rx)], [0, 1, -(dy + ry)]])
+            moved = cv2.warpAffine(b, shift, (a.shape[1], a.shape[0]), flags=cv2.INTER_NEAREST)
+            count = cv2.countNonZero(cv2.bitwise_xor(a, moved))
+            if best_count is None or count < best_count:
+                best, best_count = moved, count
+    return best
+
+
+def _thumbs_match(thumb_a, thumb_b):
+    """Compara la tinta de dos páginas binarizadas tras alinearlas
+
+    Se compensa el desplazamiento entre ambas y se busca tinta de cada una
+    que no esté a 1 píxel de ningún trazo de la otra: los bordes de los
+    trazos (ruido de escaneo, compresión) no cuentan, pero cualquier zona
+    de VERIFY_MIN_CLUSTER píxeles o más (una cifra, una letra, una marca
+    distinta) hace que las páginas sean diferentes. Un falso "distinto"
+    solo cuesta repetir el OCR; un falso "igual" copiaría el texto de otra
+    página.
+    """
+    a, b = _unpack_thumb(thumb_a), _unpack_thumb(thumb_b)
+    b = _align(a, b)
+    if b is None:
+        return False
+
+    kernel = np.ones((3, 3), np.uint8)
+    only_a = cv2.bitwise_and(a, cv2.bitwise_not(cv2.dilate(b, kernel)) & 1)
+    only_b = cv2.bitwise_and(b, cv2.bitwise_not(cv2.dilate(a, kernel)) & 1)
+    diff = cv2.bitwise_or(only_a, only_b)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(diff, connectivity=8)
+    return count <= 1 or int(stats[1:, cv2.CC_STAT_AREA].max()) < VERIFY_MIN_CLUSTER
+
+
+def same_page(fp, other):
+    """Verifica que dos huellas corresponden a la misma página
+
+    Los hashes solo seleccionan candidatos: dos formularios con la misma
+    plantilla y datos distintos tienen hashes casi iguales. La decisión se
+    toma comparando la tinta de las páginas binarizadas (ver _thumbs_match).
+    """
+    if abs(fp["aspect"] - other["aspect"]) > MAX_ASPECT_DIFFERENCE * fp["aspect"]:
+        return False
+    if bin(fp["phash"] ^ other["phash"]).count("1") > MAX_HASH_DISTANCE:
+        return False
+    if bin(fp["dhash"] ^ other["dhash"]).count("1") > MAX_HASH_DISTANCE:
+        return False
+    return _thumbs_match(fp["thumb"], other["thumb"])
+
+
+class PageCache:
+    """Índice de páginas ya reconocidas para reutilizar su texto en copias casi idénticas
+
+    Las entradas se indexan por las bandas del pHash y por el modelo que
+    hizo el OCR (un texto de otro modelo no se reutiliza). Se guardan en
+    memoria durante el proceso y, si se indica path, también en una base de
+    datos SQLite que se comparte entre ejecuciones y documentos.
+
+    max_entries limita las páginas guardadas (en memoria y en la base de
+    datos se descartan las más antiguas) y max_age_days descarta las que
+    llevan más de esos días guardadas (0 = sin límite). La verificación de
+    los candidatos (same_page) se hace fuera del cerrojo para que los hilos
+    de OCR no esperen unos a otros.
+    """
+
+    def __init__(self, path=None, max_entries=0, max_age_days=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self._entries = []
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._stores = 0
+        if path:
+            with self._lock:
+                self._prune()
+
+    def lookup(self, fp, model):
+        """Texto de una página ya reconocida igual a la huella fp (None si no hay)"""
+        with self._lock:
+            candidates = list(self._candidates(fp, model))
+            stored = list(self._stored_candidates(fp, model)) if self.path else []
+        # Las páginas guardadas en esta ejecución también están en memoria: no se verifican dos veces
+        known = {(entry["phash"], entry["dhash"], entry["text"]) for entry in candidates}
+        stored = [entry for entry in stored if (entry["phash"], entry["dhash"], entry["text"]) not in known]
+        for entry in candidates:
+            if same_page(fp, entry):
+                return entry["text"]
+        for entry in stored:
+            if same_page(fp, entry):
+                with self._lock:
+                    self._add(entry)
+                return entry["text"]
+        return None
+
+    def store(self, fp, model, text):
+        """Guarda el texto reconocido de la página con huella fp"""
+        entry = dict(fp, model=model, text=text, created=time.time())
+        with self._lock:
+            self._add(entry)
+            if self.path:
+                db = self._connection()
+                db.execute(
+                    f"INSERT INTO pages (model, phash, dhash, aspect, thumb, text, created, "
+                    f"{', '.join(f'band{i}' for i in range(HASH_BANDS))}) "
+                    f"VALUES ({', '.join('?' * (7 + HASH_BANDS))})",
+                    (model, _signed(fp["phash"]), _signed(fp["dhash"]), fp["aspect"],
+                     fp["thumb"], text, entry["created"], *_bands(fp["phash"]))
+                )
+                db.commit()
+                self._stores += 1
+                if self._stores % PRUNE_EVERY == 0:
+                    self._prune()
+
+    def close(self):
+        """Cierra la base de datos (se vuelve a abrir si se usa de nuevo)"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages (model TEXT, phash INTEGER, dhash INTEGER, aspect REAL, "
+                "thumb BLOB, text TEXT, created REAL, "
+                + ", ".join(f"band{i} INTEGER" for i in range(HASH_BANDS)) + ")"
+            )
+            for i in range(HASH_BANDS):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS pages_band{i} ON pages (model, band{i})")
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_created ON pages (created)")
+            self._db.commit()
+        return self._db
+
+    def _oldest_allowed(self):
+        return time.time() - self.max_age if self.max_age > 0 else 0
+
+    def _prune(self):
+        """Borra de la base de datos las páginas caducadas y las que sobran de max_entries"""
+        db = self._connection()
+        removed = db.execute("DELETE FROM pages WHERE created < ?", (self._oldest_allowed(),)).rowcount
+        if self.max_entries > 0:
+            removed += db.execute(
+                "DELETE FROM pages WHERE rowid NOT IN "
+                "(SELECT rowid FROM pages ORDER BY created DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+        db.commit()
+        if removed > 0:
+            print(f"[INFO] Índice de páginas: {removed} página(s) antiguas eliminadas")
+
+    def _add(self, entry):
+        self._entries.append(entry)
+        for i, band in enumerate(_bands(entry["phash"])):
+            self._buckets.setdefault((entry["model"], i, band), []).append(entry)
+        if self.max_entries > 0 and len(self._entries) > self.max_entries:
+            self._discard(self._entries.pop(0))
+
+    def _discard(self, entry):
+        for i, band in enumerate(_bands(entry["phash"])):
+            bucket = self._buckets.get((entry["model"], i, band), [])
+            bucket[:] = [other for other in bucket if other is not entry]
+            if not bucket:
+                self._buckets.pop((entry["model"], i, band), None)
+
+    def _candidates(self, fp, model):
+        seen = set()
+        for i, band in enumerate(_bands(fp["phash"])):
+            for entry in self._buckets.get((model, i, band), []):
+                if id(entry) not in seen and entry["created"] >= self._oldest_allowed():
+                    seen.add(id(entry))
+                    yield entry
+
+    def _stored_candidates(self, fp, model):
+        conditions = " OR ".join(f"band{i} = ?" for i in range(HASH_BANDS))
+        rows = self._connection().execute(
+            f"SELECT phash, dhash, aspect, thumb, text, created FROM pages "
+            f"WHERE model = ? AND created >= ? AND ({conditions})",
+            (model, self._oldest_allowed(), *_bands(fp["phash"]))
+        )
+        for stored_phash, stored_dhash, aspect, thumb, text, created in rows:
+            yield {
+                "model": model,
+                "phash": _unsigned(stored_phash),
+                "dhash": _unsigned(stored_dhash),
+                "aspect": aspect,
+                "thumb": bytes(thumb),
+                "text": text,
+                "created": created,
+            }
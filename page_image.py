@@ -0,0 +1,125 @@
+import base64
+import os
+import cv2
+
+
+# Tipos MIME de los formatos de codificación soportados
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+class PageImage:
+    """Imagen de una página en memoria que pasa entre renderizado, preprocesamiento y OCR
+
+    Guarda el array NumPy (RGB alto x ancho x 3, o escala de grises alto x ancho)
+    y codifica la imagen bajo demanda. Cada codificación se calcula una sola vez
+    y se guarda en caché, así cada página se codifica exactamente una vez en el
+    formato que pide el backend de OCR. Solo se escribe a disco con save().
+    """
+
+    def __init__(self, array, index=None, metadata=None):
+        self.array = array
+        self.index = index  # Índice de página desde 0 (None si no viene de un PDF)
+        self.metadata = metadata if metadata is not None else {}
+        self._encoded = {}
+
+    @classmethod
+    def from_file(cls, image_path, index=None):
+        """Carga una imagen de disco (compatibilidad con el flujo basado en rutas)"""
+        array = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        if array is None:
+            raise Exception(f"No se pudo leer la imagen: {image_path}")
+        if array.ndim == 3:
+            if array.shape[2] == 4:
+                array = cv2.cvtColor(array, cv2.COLOR_BGRA2RGB)
+            else:
+                array = cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
+        return cls(array, index=index, metadata={"source": image_path})
+
+    @property
+    def width(self):
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        return self.array.shape[0]
+
+    @property
+    def bilevel(self):
+        """True si la página solo contiene blanco y negro puros (0/255)"""
+        return self.metadata.get("bilevel", False)
+
+    @property
+    def page_num(self):
+        return self.index + 1 if self.index is not None else None
+
+    @property
+    def name(self):
+        """Nombre legible para los mensajes de log"""
+        if "source" in self.metadata:
+            return os.path.basename(self.metadata["source"])
+        return f"page_{self.page_num}"
+
+    def replace_array(self, array):
+        """Sustituye el contenido de la página e invalida las codificaciones en caché"""
+        self.array = array
+        self._encoded.clear()
+
+    def to_gray(self):
+        """Retorna el contenido en escala de grises (sin copiar si ya lo está)"""
+        if self.array.ndim == 2:
+            return self.array
+        return cv2.cvtColor(self.array, cv2.COLOR_RGB2GRAY)
+
+    def encode(self, fmt="png", quality=None):
+        """Codifica la página en el formato indicado (una sola vez por formato y calidad)
+        
+        quality (1-100) solo afecta a JPEG y WebP; None = valor por defecto de OpenCV.
+        """
+        fmt = fmt.lower()
+        key = (fmt, quality)
+        if key not in self._encoded:
+            self._encoded[key] = self._encode_array(fmt, quality)
+        return self._encoded[key]
+    
+    def _encode_array(self, fmt, quality=None):
+        if fmt not in MIME_TYPES:
+            raise Exception(f"Formato de imagen no soportado: {fmt}")
+        
+        array = self.array
+        if array.ndim == 3:
+            array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+        
+        params = []
+        if fmt == "png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+            if self.bilevel and array.ndim == 2:
+                # PNG de 1 bit por píxel: 8 veces menos datos que en gris
+                params += [cv2.IMWRITE_PNG_BILEVEL, 1]
+        elif quality is not None:
+            flag = cv2.IMWRITE_JPEG_QUALITY if fmt == "jpeg" else cv2.IMWRITE_WEBP_QUALITY
+            params = [flag, int(quality)]
+        
+        ok, buffer = cv2.imencode(f".{fmt}", array, params)
+        if not ok:
+            raise Exception(f"No se pudo codificar la página como {fmt}")
+        return buffer.tobytes()
+    
+    def to_base64(self, fmt="png", quality=None):
+        return base64.b64encode(self.encode(fmt, quality)).decode('utf-8')
+
+    def mime_type(self, fmt="png"):
+        return MIME_TYPES[fmt.lower()]
+
+    def save(self, image_path, fmt=None):
+        """Escribe la página a disco (solo para depuración o compatibilidad)"""
+        if fmt is None:
+            fmt = os.path.splitext(image_path)[1].lstrip('.').lower() or "png"
+            if fmt == "jpg":
+                fmt = "jpeg"
+        with open(image_path, "wb") as f:
+            f.write(self.encode(fmt))
+        return image_path
@@ -1,5 +1,7 @@
 import os
 import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from PyPDF2 import PdfReader
 from pdf2image import convert_from_path
 from fpdf import FPDF
@@ -8,7 +10,499 @@ import platform
 from config import Config
 import cv2
 import numpy as np
-from PIL import Image
+from page_image import PageImage
+from image_analysis import estimate_x_height, blank_page_reason
+from image_preprocessing import enhance_page
+from text_quality import score_text_layer
+from ollama_stream import combine_stats, TRUNCATION_REASONS
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24.3
+    except ImportError:
+        fitz = None
+
+
+def _group_page_windows(page_indices, batch_size):
+    """Agrupa índices de página ordenados en ventanas de páginas consecutivas
+    
+    Retorna tuplas (primera_página, última_página) numeradas desde 1, con
+    como máximo batch_size páginas cada una.
+    """
+    windows = []
+    for page_index in page_indices:
+        page_num = page_index + 1
+        if windows:
+            first_page, last_page = windows[-1]
+            if page_num == last_page + 1 and page_num - first_page < batch_size:
+                windows[-1] = (first_page, page_num)
+                continue
+        windows.append((page_num, page_num))
+    return windows
+
+
+def _bounded_ordered_map(executor, fn, items, max_pending):
+    """Versión perezosa de executor.map con un máximo de tareas en vuelo
+    
+    Envía como máximo max_pending tareas a la vez y genera los resultados en
+    el mismo orden que items, así la memoria no crece con el número de tareas.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Si el consumidor se detiene antes de tiempo, no dejar trabajo pendiente
+        for future in pending:
+            future.cancel()
+
+
+def _enhance_unless_blank(page):
+    """Preprocesa la página salvo que esté marcada como en blanco (tarea del pool)"""
+    if page.metadata.get("blank"):
+        return page
+    return enhance_page(page)
+
+
+class PDFBackend:
+    """Interfaz de renderizado y extracción de texto de un documento PDF
+    
+    Cada implementación mantiene el documento abierto mientras vive; hay que
+    llamar a close() (o usarla como context manager) al terminar. Las páginas
+    se renderizan como arrays NumPy uint8: RGB (alto x ancho x 3) o, con
+    gray=True, escala de grises de un canal (alto x ancho).
+    """
+    name = "base"
+    # Si el backend puede extraer directamente la imagen incrustada de una página escaneada
+    supports_passthrough = False
+    # Si el backend puede localizar y renderizar regiones de imagen sin texto (OCR por regiones)
+    supports_regions = False
+    
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+    
+    def page_count(self):
+        raise NotImplementedError
+    
+    def extract_text(self, page_index):
+        """Retorna el texto nativo de la página (cadena vacía si no tiene)"""
+        raise NotImplementedError
+    
+    def render_page(self, page_index, dpi, gray=False):
+        """Renderiza una página como array NumPy RGB (o gris de un canal)"""
+        raise NotImplementedError
+    
+    def render_pages(self, page_indices, dpi, batch_size=1, gray=False):
+        """Renderiza varias páginas de forma perezosa
+        
+        Genera tuplas (índice_de_página, array) en el orden de page_indices.
+        """
+        for page_index in page_indices:
+            yield page_index, self.render_page(page_index, dpi, gray)
+    
+    def analyze_text_layer(self, page_index):
+        """Texto nativo de la página junto con las áreas (pt²) que ocupan texto e imágenes
+        
+        Retorna un diccionario con "text", "text_area" e "image_area"; las áreas
+        son None si el backend no puede medirlas. Los backends con
+        supports_regions añaden "blocks" (lista de (bbox, texto) en orden de
+        lectura) y "regions" (bboxes de imágenes que la capa de texto no cubre).
+        """
+        return {"text": self.extract_text(page_index), "text_area": None, "image_area": None}
+    
+    def render_region(self, page_index, bbox, dpi, gray=False):
+        """Renderiza solo el rectángulo bbox (en puntos) de la página"""
+        raise NotImplementedError
+    
+    def font_sizes(self, page_index):
+        """Tamaños de fuente de la capa de texto como tuplas (tamaño_pt, num_caracteres)"""
+        return []
+    
+    def extract_page_image(self, page_index):
+        """Extrae la imagen escaneada de la página a su resolución nativa
+        
+        Retorna (array, dpi_efectivo) si la página es una única imagen que la
+        cubre sin nada pintado encima, o None si hay que renderizarla.
+        """
+        return None
+    
+    def reopen_args(self):
+        """Argumentos para abrir el mismo documento en otro proceso"""
+        return {}
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PopplerBackend(PDFBackend):
+    """Backend original: pdf2image (pdftoppm) para renderizar y PyPDF2 para texto"""
+    name = "poppler"
+    
+    def __init__(self, pdf_path, poppler_path=None):
+        super().__init__(pdf_path)
+        self.poppler_path = poppler_path
+        self.reader = PdfReader(pdf_path)
+    
+    def page_count(self):
+        return len(self.reader.pages)
+    
+    def extract_text(self, page_index):
+        return self.reader.pages[page_index].extract_text() or ""
+    
+    def reopen_args(self):
+        return {"poppler_path": self.poppler_path}
+    
+    def render_page(self, page_index, dpi, gray=False):
+        for _, array in self.render_pages([page_index], dpi, gray=gray):
+            return array
+    
+    def render_pages(self, page_indices, dpi, batch_size=1, gray=False):
+        # Cada llamada a pdftoppm renderiza una ventana de páginas consecutivas
+        poppler_kwargs = {"poppler_path": self.poppler_path} if self.poppler_path else {}
+        
+        for first_page, last_page in _group_page_windows(page_indices, batch_size):
+            try:
+                images = convert_from_path(
+                    self.pdf_path,
+                    dpi=dpi,
+                    first_page=first_page,
+                    last_page=last_page,
+                    grayscale=gray,
+                    **poppler_kwargs
+                )
+            except Exception as e:
+                error_msg = f"Error al convertir PDF a imágenes: {str(e)}"
+                raise Exception(error_msg)
+            
+            page_index = first_page - 1
+            while images:
+                # Sacar la imagen de la lista para liberarla en cuanto se convierta
+                image = images.pop(0)
+                # Convertir al modo pedido si es necesario (algunos PDFs pueden tener otros modos)
+                mode = 'L' if gray else 'RGB'
+                if image.mode != mode:
+                    image = image.convert(mode)
+                array = np.asarray(image)
+                image.close()
+                del image
+                
+                yield page_index, array
+                page_index += 1
+
+
+class PyMuPDFBackend(PDFBackend):
+    """Backend PyMuPDF: renderiza en el propio proceso directamente a NumPy
+    
+    Evita lanzar pdftoppm/pdfinfo y el paso por archivos PPM en cada llamada;
+    la extracción de texto también es varias veces más rápida que PyPDF2.
+    """
+    name = "pymupdf"
+    supports_passthrough = True
+    supports_regions = True
+    # Fracción mínima de la página que debe cubrir la imagen para extraerla directamente
+    PASSTHROUGH_MIN_COVERAGE = 0.85
+    # Fracción mínima de la página que debe ocupar una imagen para hacerle OCR por separado
+    REGION_MIN_AREA_RATIO = 0.02
+    # Una imagen con menos de esta fracción cubierta por líneas de texto se considera sin texto
+    REGION_MAX_TEXT_COVERAGE = 0.1
+    
+    def __init__(self, pdf_path):
+        if fitz is None:
+            raise Exception("Librería 'pymupdf' no instalada. Ejecuta: pip install pymupdf")
+        super().__init__(pdf_path)
+        self.doc = fitz.open(pdf_path)
+    
+    def page_count(self):
+        return self.doc.page_count
+    
+    def extract_text(self, page_index):
+        return self.doc[page_index].get_text("text") or ""
+    
+    def render_page(self, page_index, dpi, gray=False):
+        colorspace = fitz.csGRAY if gray else fitz.csRGB
+        pixmap = self.doc[page_index].get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+        shape = (pixmap.height, pixmap.width) if gray else (pixmap.height, pixmap.width, pixmap.n)
+        array = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(shape)
+        return array
+    
+    def analyze_text_layer(self, page_index):
+        page = self.doc[page_index]
+        # Sin TEXT_PRESERVE_IMAGES para no decodificar las imágenes; sus áreas salen de get_image_info
+        flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+        blocks = []
+        line_rects = []
+        text_area = 0.0
+        for block in page.get_text("dict", flags=flags)["blocks"]:
+            block_lines = []
+            for line in block.get("lines", []):
+                line_text = "".join(span["text"] for span in line["spans"])
+                if line_text.strip():
+                    block_lines.append(line_text)
+                    line_rect = fitz.Rect(line["bbox"]) & page.rect
+                    line_rects.append(line_rect)
+                    text_area += line_rect.get_area()
+            if block_lines:
+                blocks.append((tuple(block["bbox"]), "\n".join(block_lines)))
+        
+        image_rects = []
+        image_area = 0.0
+        for info in page.get_image_info():
+            rect = fitz.Rect(info["bbox"]) & page.rect
+            if not rect.is_empty:
+                image_rects.append(rect)
+                image_area += rect.get_area()
+        
+        return {
+            "text": "\n".join(text for _, text in blocks),
+            "text_area": text_area,
+            "image_area": image_area,
+            "blocks": blocks,
+            "regions": self._uncovered_image_regions(page, image_rects, line_rects),
+        }
+    
+    def _uncovered_image_regions(self, page, image_rects, line_rects):
+        """Rectángulos de imagen (fusionando los que se solapan) que la capa de texto no cubre"""
+        merged = []
+        for rect in image_rects:
+            rect = fitz.Rect(rect)
+            for other in [m for m in merged if m.intersects(rect)]:
+                rect |= other
+                merged.remove(other)
+            merged.append(rect)
+        
+        min_area = self.REGION_MIN_AREA_RATIO * page.rect.get_area()
+        regions = []
+        for rect in merged:
+            area = rect.get_area()
+            if area < min_area:
+                continue
+            covered = sum((rect & line_rect).get_area() for line_rect in line_rects)
+            if covered / area < self.REGION_MAX_TEXT_COVERAGE:
+                regions.append(tuple(rect))
+        return regions
+    
+    def render_region(self, page_index, bbox, dpi, gray=False):
+        page = self.doc[page_index]
+        clip = fitz.Rect(bbox) & page.rect
+        colorspace = fitz.csGRAY if gray else fitz.csRGB
+        pixmap = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False, clip=clip)
+        shape = (pixmap.height, pixmap.width) if gray else (pixmap.height, pixmap.width, pixmap.n)
+        return np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(shape)
+    
+    def font_sizes(self, page_index):
+        sizes = []
+        for block in self.doc[page_index].get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    num_chars = len(span["text"].strip())
+                    if num_chars:
+                        sizes.append((span["size"], num_chars))
+        return sizes
+    
+    @staticmethod
+    def _has_overlay(page):
+        """Indica si algo se pinta sobre la imagen escaneada
+        
+        Dibujos vectoriales (tachados de redacción, sellos, líneas de
+        formulario), texto visible y anotaciones cambian lo que se ve al
+        renderizar: con ellos la imagen sola no es la página (p. ej. dejaría
+        legible un dato tapado con un recuadro negro). El texto invisible
+        (modo 3, la capa OCR de un escaneo) no se ve y no cuenta.
+        """
+        if page.get_drawings() or page.first_annot is not None or page.first_widget is not None:
+            return True
+        return any(span["type"] != 3 and span["opacity"] > 0 for span in page.get_texttrace())
+    
+    def extract_page_image(self, page_index):
+        page = self.doc[page_index]
+        if page.rotation != 0 or self._has_overlay(page):
+            return None
+        
+        # Solo páginas con exactamente una imagen, sin máscara, colocada derecha
+        images = page.get_images(full=True)
+        infos = page.get_image_info(xrefs=True)
+        if len(images) != 1 or len(infos) != 1 or infos[0].get("has-mask"):
+            return None
+        info = infos[0]
+        a, b, c, d, _, _ = info["transform"]
+        if abs(b) > 1e-3 or abs(c) > 1e-3 or a <= 0 or d <= 0:
+            return None
+        
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        if bbox.is_empty or bbox.get_area() < self.PASSTHROUGH_MIN_COVERAGE * page.rect.get_area():
+            return None
+        
+        # Decodificar el flujo de la imagen (JPEG, CCITT, JBIG2...) sin rasterizar la página
+        xref = images[0][0]
+        pixmap = fitz.Pixmap(self.doc, xref)
+        if pixmap.colorspace is None:
+            # Máscaras de imagen (stencil): su semántica depende del contexto, mejor renderizar
+            return None
+        if pixmap.alpha:
+            pixmap = fitz.Pixmap(pixmap, 0)
+        if pixmap.n not in (1, 3):
+            pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+        
+        shape = (pixmap.height, pixmap.width) if pixmap.n == 1 else (pixmap.height, pixmap.width, pixmap.n)
+        array = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(shape)
+        dpi = round(pixmap.width * 72 / abs(a))
+        return array, dpi
+    
+    def close(self):
+        self.doc.close()
+
+
+PDF_BACKENDS = {
+    PopplerBackend.name: PopplerBackend,
+    PyMuPDFBackend.name: PyMuPDFBackend,
+}
+
+
+# Documento abierto por cada proceso de los pools de renderizado y de texto
+_worker_backend = None
+
+
+def _init_backend_worker(backend_class, pdf_path, backend_kwargs):
+    """Inicializa un proceso del pool con su propio documento abierto"""
+    global _worker_backend
+    _worker_backend = backend_class(pdf_path, **backend_kwargs)
+
+
+def _merge_in_reading_order(blocks, region_texts):
+    """Inserta los textos de las regiones entre los bloques de texto nativo
+    
+    blocks y region_texts son listas de (bbox, texto). Los bloques conservan
+    su orden; cada región se coloca antes del primer bloque que empieza más
+    abajo que ella.
+    """
+    merged = list(blocks)
+    for bbox, text in sorted(region_texts, key=lambda item: item[0][1]):
+        position = next((k for k, (other, _) in enumerate(merged) if other[1] > bbox[1]), len(merged))
+        merged.insert(position, (bbox, text))
+    return "\n".join(text for _, text in merged)
+
+
+def _analyze_page(backend, page_index):
+    """Analiza la capa de texto de una página sin propagar errores"""
+    try:
+        return backend.analyze_text_layer(page_index)
+    except Exception as e:
+        return {"text": "", "text_area": None, "image_area": None, "error": str(e)}
+
+
+def _analyze_page_in_worker(page_index):
+    return _analyze_page(_worker_backend, page_index)
+
+
+# Páginas por proceso a partir de las cuales la capa de texto se analiza en paralelo
+PARALLEL_TEXT_MIN_PAGES = 16
+
+# Resolución de la pasada rápida usada para medir el tamaño del texto
+ADAPTIVE_DPI_PROBE = 96
+
+
+def _to_gray(array):
+    return array if array.ndim == 2 else cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+
+
+def _weighted_median(values_weights):
+    values_weights = sorted(values_weights)
+    half = sum(weight for _, weight in values_weights) / 2
+    accumulated = 0
+    for value, weight in values_weights:
+        accumulated += weight
+        if accumulated >= half:
+            return value
+
+
+def _select_page_dpi(backend, page_index, array=None, native_dpi=None):
+    """Elige el DPI mínimo con el que la altura x del texto llega a Config.TARGET_X_HEIGHT_PX
+    
+    La altura x se estima con los tamaños de fuente de la capa de texto o, si
+    no hay, con las componentes conexas de una versión a baja resolución de la
+    página (array a native_dpi si ya se tiene, o un renderizado rápido).
+    Retorna None si no se puede estimar.
+    """
+    sizes = backend.font_sizes(page_index)
+    if sizes:
+        # La altura x ronda la mitad del tamaño nominal de la fuente
+        x_height_pt = 0.5 * _weighted_median(sizes)
+    else:
+        if array is not None:
+            probe_dpi = min(native_dpi, ADAPTIVE_DPI_PROBE)
+            probe = _to_gray(array)
+            if probe_dpi < native_dpi:
+                scale = probe_dpi / native_dpi
+                probe = cv2.resize(probe, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            probe_dpi = ADAPTIVE_DPI_PROBE
+            probe = backend.render_page(page_index, probe_dpi, gray=True)
+        x_height_px = estimate_x_height(probe)
+        if not x_height_px:
+            return None
+        x_height_pt = x_height_px * 72 / probe_dpi
+    
+    if x_height_pt <= 0:
+        return None
+    dpi = Config.TARGET_X_HEIGHT_PX * 72 / x_height_pt
+    dpi = min(max(dpi, Config.ADAPTIVE_DPI_MIN), Config.ADAPTIVE_DPI_MAX)
+    return int(-(-dpi // 10) * 10)  # Redondear hacia arriba a múltiplos de 10
+
+
+def _load_page(backend, page_index, dpi, passthrough=False, adaptive=False, gray=False):
+    """Obtiene los píxeles de una página: imagen incrustada si se puede, si no la renderiza
+    
+    Con adaptive se elige el DPI de cada página según el tamaño de su texto;
+    las imágenes incrustadas solo se reducen (si su resolución no llega al
+    objetivo, las amplía la etapa upscale del preprocesado). Con gray la
+    página se obtiene en escala de grises de un canal.
+    Retorna (índice_de_página, array, metadatos).
+    """
+    if passthrough:
+        extracted = backend.extract_page_image(page_index)
+        if extracted is not None:
+            array, native_dpi = extracted
+            if gray and array.ndim == 3:
+                array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+            metadata = {"dpi": native_dpi, "native_dpi": native_dpi, "passthrough": True}
+            if adaptive:
+                target_dpi = _select_page_dpi(backend, page_index, array, native_dpi)
+                if target_dpi and target_dpi <= native_dpi:
+                    # El escaneo llega al tamaño de texto objetivo: reducirlo hasta él
+                    metadata["adaptive_dpi"] = True
+                    if target_dpi < native_dpi:
+                        scale = target_dpi / native_dpi
+                        array = cv2.resize(array, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                        metadata["dpi"] = target_dpi
+                # Si no llega (p. ej. un fax a 150 DPI), sin adaptive_dpi la etapa
+                # upscale amplía lo que falte hasta la altura x objetivo
+            return page_index, array, metadata
+    
+    metadata = {"dpi": dpi}
+    if adaptive:
+        target_dpi = _select_page_dpi(backend, page_index)
+        if target_dpi:
+            dpi = target_dpi
+            metadata = {"dpi": dpi, "adaptive_dpi": True}
+    return page_index, backend.render_page(page_index, dpi, gray), metadata
+
+
+def _render_page_in_worker(task):
+    page_index, dpi, passthrough, adaptive, gray = task
+    return _load_page(_worker_backend, page_index, dpi, passthrough, adaptive, gray)
+
 
 class PDFProcessor:
     def __init__(self):
@@ -17,88 +511,35 @@ class PDFProcessor:
         self.temp_dir = tempfile.mkdtemp()
         self.poppler_path = self._find_poppler_aggressive()
     
-    def enhance_image_for_ocr(self, image_path):
+    def enhance_image_for_ocr(self, image):
         """Mejora la calidad de la imagen para OCR siguiendo las mejores prácticas
         
-        Aplica:
-        1. Eliminación de ruido
-        2. Enderezamiento (deskew)
-        3. Binarización (alto contraste B/N)
-        4. Escalado moderado para texto pequeño
+        Aplica las etapas de Config.PREPROCESSING_PIPELINE (por defecto:
+        escala de grises, reducción si el texto sobra, eliminación de ruido,
+        enderezamiento, escalado moderado para texto pequeño y binarización).
+        Las etapas están registradas en image_preprocessing.py.
+        
+        Con ADAPTIVE_PREPROCESSING solo se ejecutan las etapas que la página
+        necesita según sus estadísticas. Las etapas ejecutadas y su duración
+        quedan en page.metadata["preprocessing"].
+        
+        Recibe un PageImage y lo retorna con el contenido mejorado, sin pasar
+        por disco. Por compatibilidad también acepta una ruta; en ese caso
+        guarda el resultado como *_enhanced.png y retorna su ruta.
         """
-        try:
-            # Leer imagen
-            img = cv2.imread(image_path)
-            if img is None:
-                print(f"[WARN] No se pudo leer imagen para preprocesar: {image_path}")
+        if isinstance(image, str):
+            image_path = image
+            try:
+                page = PageImage.from_file(image_path)
+            except Exception as e:
+                print(f"[WARN] No se pudo leer imagen para preprocesar: {image_path} ({str(e)})")
                 return image_path
-            
-            print(f"[INFO] Preprocesando imagen: {os.path.basename(image_path)}")
-            
-            # 1. Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # 2. Eliminación de ruido con fastNlMeansDenoising
-            print("  - Eliminando ruido...")
-            denoised = cv2.fastNlMeansDenoising(gray, None, h=10, templateWindowSize=7, searchWindowSize=21)
-            
-            # 3. Enderezamiento (deskew) usando transformada de Hough
-            print("  - Enderezando página...")
-            coords = np.column_stack(np.where(denoised > 0))
-            if len(coords) > 0:
-                angle = cv2.minAreaRect(coords)[-1]
-                if angle < -45:
-                    angle = -(90 + angle)
-                else:
-                    angle = -angle
-                
-                # Solo corregir si el ángulo es significativo (> 0.5 grados)
-                if abs(angle) > 0.5:
-                    print(f"    Ángulo detectado: {angle:.2f}°")
-                    (h, w) = denoised.shape[:2]
-                    center = (w // 2, h // 2)
-                    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    denoised = cv2.warpAffine(denoised, M, (w, h), 
-                                             flags=cv2.INTER_CUBIC, 
-                                             borderMode=cv2.BORDER_REPLICATE)
-            
-            # 4. Binarización adaptativa (mejor que threshold simple para iluminación irregular)
-            print("  - Aplicando binarización...")
-            binary = cv2.adaptiveThreshold(
-                denoised, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 
-                11, 2
-            )
-            
-            # 5. Escalado moderado para mejorar texto pequeño
-            if Config.IMAGE_SCALE_FACTOR > 1.0:
-                print(f"  - Escalando imagen {Config.IMAGE_SCALE_FACTOR}x...")
-                new_width = int(binary.shape[1] * Config.IMAGE_SCALE_FACTOR)
-                new_height = int(binary.shape[0] * Config.IMAGE_SCALE_FACTOR)
-                binary = cv2.resize(binary, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-            
-            # Guardar imagen mejorada
-            enhanced_path = image_path.replace('.png', '_enhanced.png')
-            cv2.imwrite(enhanced_path, binary)
-            
-            # Verificar tamaño del archivo
-            file_size = os.path.getsize(enhanced_path)
-            print(f"  ✓ Imagen preprocesada: {file_size/1024/1024:.2f}MB")
-            
-            # Si es muy grande, reducir calidad
-            if file_size > 25 * 1024 * 1024:  # 25MB
-                print(f"  - Reduciendo tamaño de archivo...")
-                # Convertir a PIL para comprimir mejor
-                pil_img = Image.fromarray(binary)
-                pil_img.save(enhanced_path, "PNG", optimize=True, compress_level=9)
-            
-            return enhanced_path
-            
-        except Exception as e:
-            print(f"[ERROR] Error en preprocesamiento: {str(e)}")
-            print(f"  Usando imagen original sin preprocesar")
-            return image_path
+            page = self.enhance_image_for_ocr(page)
+            if not page.metadata.get("enhanced"):
+                return image_path
+            return page.save(image_path.replace('.png', '_enhanced.png'))
+        
+        return enhance_page(image)
     
     def _find_poppler_aggressive(self):
         """Búsqueda agresiva de poppler en el proyecto"""
@@ -126,70 +567,445 @@ class PDFProcessor:
                         return test_path
         return None
 
-    def extract_images_from_pdf(self, pdf_path, progress_callback=None):
-        """Extrae imágenes de cada página del PDF con alta resolución"""
-        if progress_callback:
-            progress_callback("extracting", 0, 1, "Extrayendo imágenes del PDF...")
+    def open_backend(self, pdf_path):
+        """Abre el PDF con el backend configurado en Config.PDF_BACKEND
         
-        # Usar DPI más alto para mejor calidad OCR
-        dpi = Config.IMAGE_DPI  # 300 DPI por defecto
-        print(f"[INFO] Extrayendo imágenes a {dpi} DPI...")
+        "auto" usa PyMuPDF si está instalado; si PyMuPDF no está disponible o
+        no puede abrir el archivo, se usa poppler/pdf2image como respaldo.
+        """
+        backend_name = Config.PDF_BACKEND
+        if backend_name == "auto":
+            backend_name = PyMuPDFBackend.name if fitz is not None else PopplerBackend.name
+        if backend_name not in PDF_BACKENDS:
+            print(f"[WARN] Backend PDF desconocido '{backend_name}', usando {PopplerBackend.name}")
+            backend_name = PopplerBackend.name
         
-        try:
-            if self.poppler_path:
-                images = convert_from_path(
-                    pdf_path, 
-                    dpi=dpi, 
-                    poppler_path=self.poppler_path
-                )
-            else:
-                images = convert_from_path(pdf_path, dpi=dpi)
-                
-        except Exception as e:
-            error_msg = f"Error al convertir PDF a imágenes: {str(e)}"
-            raise Exception(error_msg)
+        if backend_name == PyMuPDFBackend.name:
+            try:
+                return PyMuPDFBackend(pdf_path)
+            except Exception as e:
+                print(f"[WARN] No se pudo usar PyMuPDF ({str(e)}), usando poppler como respaldo")
         
-        image_paths = []
-        for i, image in enumerate(images):
-            image_path = os.path.join(self.temp_dir, f"page_{i+1}.png")
-            
-            # Optimizar imagen para OCR (formato PNG de calidad)
-            # Convertir a RGB si es necesario (algunos PDFs pueden tener otros modos)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        return PopplerBackend(pdf_path, poppler_path=self.poppler_path)
+
+    def _save_debug_image(self, page, suffix=""):
+        """Escribe la página a disco solo si se pidió para depuración"""
+        if not Config.SAVE_DEBUG_IMAGES:
+            return
+        debug_dir = Config.DEBUG_IMAGE_DIR or os.path.join(self.temp_dir, "debug")
+        os.makedirs(debug_dir, exist_ok=True)
+        page.save(os.path.join(debug_dir, f"page_{page.page_num}{suffix}.png"))
+
+    def _prepare_page_image(self, array, page_index, metadata=None, enhance=True):
+        """Crea el PageImage de una página renderizada y lo preprocesa en memoria
+        
+        Con enhance=False solo se crea; el preprocesamiento se hace aparte
+        (ver _enhance_pages).
+        """
+        page = PageImage(array, index=page_index, metadata=metadata)
+        self._save_debug_image(page)
+        
+        # Aplicar preprocesamiento para mejorar calidad OCR
+        if enhance and Config.ENHANCE_IMAGE_QUALITY:
+            page = self.enhance_image_for_ocr(page)
+            self._save_debug_image(page, "_enhanced")
+        
+        return page
+    
+    def _enhance_pages(self, pages):
+        """Preprocesa una secuencia de PageImage conservando el orden
+        
+        Las páginas marcadas como en blanco pasan sin preprocesar.
+        
+        Con Config.PREPROCESS_WORKERS > 1 el preprocesamiento se reparte en un
+        pool de hilos (OpenCV libera el GIL) o de procesos
+        (PREPROCESS_EXECUTOR=process) que trabaja por delante del consumidor,
+        con como máximo 2 páginas por trabajador en vuelo: mientras se hace OCR
+        de una página se siguen renderizando y preprocesando las siguientes.
+        """
+        workers = Config.PREPROCESS_WORKERS
+        if workers <= 1:
+            for page in pages:
+                if not page.metadata.get("blank"):
+                    page = self.enhance_image_for_ocr(page)
+                self._save_debug_image(page, "_enhanced")
+                yield page
+            return
+        
+        if Config.PREPROCESS_EXECUTOR == "process":
+            executor_class = ProcessPoolExecutor
+        else:
+            executor_class = ThreadPoolExecutor
+        with executor_class(max_workers=workers) as executor:
+            for page in _bounded_ordered_map(executor, _enhance_unless_blank, pages, workers * 2):
+                self._save_debug_image(page, "_enhanced")
+                yield page
+
+    def _render_in_gray(self):
+        """Indica si las páginas se renderizan en escala de grises (Config.RENDER_COLOR_MODE)
+        
+        "auto" usa gris cuando el preprocesamiento está activo, ya que este
+        descarta el color de todas formas.
+        """
+        if Config.RENDER_COLOR_MODE == "auto":
+            return Config.ENHANCE_IMAGE_QUALITY
+        return Config.RENDER_COLOR_MODE == "gray"
+    
+    def _render_pages_sequential(self, backend, pages, dpi, batch_size, passthrough, adaptive, gray):
+        """Renderiza páginas en este proceso, generando (índice, array, metadatos)"""
+        if passthrough or adaptive:
+            # Página a página para extraer imágenes incrustadas o elegir el DPI de cada una
+            for page_index in pages:
+                yield _load_page(backend, page_index, dpi, passthrough, adaptive, gray)
+        else:
+            for page_index, array in backend.render_pages(pages, dpi, batch_size, gray):
+                yield page_index, array, {"dpi": dpi}
+    
+    def _render_pages_parallel(self, backend, pages, dpi, workers, passthrough, adaptive, gray):
+        """Renderiza páginas en un pool de procesos, conservando el orden
+        
+        Cada proceso abre su propio documento una sola vez. Como máximo hay
+        2 páginas por proceso en vuelo, así la memoria sigue acotada.
+        """
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_backend_worker,
+            initargs=(type(backend), backend.pdf_path, backend.reopen_args())
+        ) as executor:
+            tasks = ((page_index, dpi, passthrough, adaptive, gray) for page_index in pages)
+            yield from _bounded_ordered_map(executor, _render_page_in_worker, tasks, workers * 2)
+
+    def iter_page_images(self, pdf_path, total_pages=None, progress_callback=None, pages=None, backend=None):
+        """Renderiza el PDF de forma perezosa, una ventana de páginas a la vez
+        
+        Genera tuplas (índice_de_página, PageImage). Cada ventana de
+        Config.RENDER_BATCH_SIZE páginas se renderiza y preprocesa en memoria y
+        se libera en cuanto el consumidor la suelta, así la memoria pico no
+        depende del número de páginas del documento. El preprocesamiento se
+        solapa con el renderizado y con el consumidor (ver _enhance_pages).
+        
+        Si se indica pages (índices desde 0), solo se renderizan esas páginas.
+        Si se indica backend, se reutiliza ese documento abierto.
+        """
+        owns_backend = backend is None
+        if owns_backend:
+            backend = self.open_backend(pdf_path)
+        
+        page_images = None
+        try:
+            if total_pages is None:
+                total_pages = backend.page_count()
+            if pages is None:
+                pages = range(total_pages)
+            pages = sorted(set(pages))
             
-            # Guardar con buena calidad para OCR
-            image.save(image_path, "PNG", optimize=False, compress_level=1)
+            # Usar DPI más alto para mejor calidad OCR
+            dpi = Config.IMAGE_DPI  # 300 DPI por defecto
+            batch_size = max(1, Config.RENDER_BATCH_SIZE)
+            workers = min(Config.RENDER_WORKERS, len(pages))
+            passthrough = Config.IMAGE_PASSTHROUGH and backend.supports_passthrough
+            adaptive = Config.ADAPTIVE_DPI
+            gray = self._render_in_gray()
+            dpi_label = "DPI adaptativo" if adaptive else f"{dpi} DPI"
             
-            # Verificar tamaño del archivo (max 25MB recomendado por DeepSeek-OCR)
-            file_size = os.path.getsize(image_path)
-            if file_size > 25 * 1024 * 1024:  # 25MB
-                print(f"[DEBUG] Página {i+1} muy grande ({file_size/1024/1024:.1f}MB), reduciendo calidad...")
-                image.save(image_path, "PNG", optimize=True, quality=85)
+            if workers > 1:
+                print(f"[INFO] Renderizando {len(pages)} de {total_pages} páginas a {dpi_label} con {backend.name} ({workers} procesos)...")
+                rendered_pages = self._render_pages_parallel(backend, pages, dpi, workers, passthrough, adaptive, gray)
+            else:
+                print(f"[INFO] Renderizando {len(pages)} de {total_pages} páginas a {dpi_label} con {backend.name} (ventana de {batch_size})...")
+                rendered_pages = self._render_pages_sequential(backend, pages, dpi, batch_size, passthrough, adaptive, gray)
             
-            # Aplicar preprocesamiento para mejorar calidad OCR
+            page_images = self._page_images(rendered_pages)
             if Config.ENHANCE_IMAGE_QUALITY:
-                image_path = self.enhance_image_for_ocr(image_path)
+                page_images = self._enhance_pages(page_images)
             
-            image_paths.append(image_path)
+            rendered = 0
+            for page in page_images:
+                yield page.index, page
+                del page
+                
+                rendered += 1
+                if progress_callback:
+                    progress_callback("extracting", rendered, len(pages), "Extrayendo imágenes...")
+        finally:
+            # Cerrar la cadena de generadores (y sus pools) antes que el documento
+            if page_images is not None:
+                page_images.close()
+            if owns_backend:
+                backend.close()
+
+    def _page_images(self, rendered_pages):
+        """Convierte las tuplas (índice, array, metadatos) renderizadas en PageImage sin preprocesar"""
+        for page_index, array, metadata in rendered_pages:
+            if metadata.get("passthrough"):
+                print(f"[INFO] Página {page_index+1}: imagen escaneada extraída a su resolución nativa ({metadata['native_dpi']} DPI)")
+                if metadata["dpi"] != metadata["native_dpi"]:
+                    print(f"[INFO] Página {page_index+1}: reducida a {metadata['dpi']} DPI (adaptativo)")
+            elif metadata.get("adaptive_dpi"):
+                print(f"[INFO] Página {page_index+1}: renderizada a {metadata['dpi']} DPI (adaptativo)")
+            page = self._prepare_page_image(array, page_index, metadata, enhance=False)
+            del array
             
-            if progress_callback:
-                progress_callback("extracting", i+1, len(images), "Extrayendo imágenes...")
+            # Páginas en blanco o solo con el número de página: ni preprocesamiento ni OCR
+            if Config.SKIP_BLANK_PAGES:
+                blank = blank_page_reason(page.to_gray(), Config.BLANK_PAGE_MAX_MARKS)
+                if blank:
+                    page.metadata["blank"] = blank
+            yield page
+
+    def extract_images_from_pdf(self, pdf_path, progress_callback=None):
+        """Extrae imágenes de cada página del PDF con alta resolución
+        
+        Las páginas se renderizan una a una con iter_page_images y se guardan
+        como PNG en el directorio temporal; solo se acumulan las rutas de los
+        archivos, no los rásteres.
+        """
+        if progress_callback:
+            progress_callback("extracting", 0, 1, "Extrayendo imágenes del PDF...")
         
+        image_paths = []
+        for page_index, page in self.iter_page_images(pdf_path, progress_callback=progress_callback):
+            suffix = "_enhanced" if page.metadata.get("enhanced") else ""
+            image_path = os.path.join(self.temp_dir, f"page_{page_index+1}{suffix}.png")
+            image_paths.append(page.save(image_path))
         return image_paths
     
-    def extract_text_with_pypdf2(self, pdf_path):
-        """Intenta extraer texto directamente del PDF"""
+    def _analyze_text_layers(self, backend, total_pages):
+        """Analiza la capa de texto de todas las páginas, en paralelo si el documento es grande
+        
+        Genera tuplas (índice_de_página, análisis) en orden.
+        """
+        workers = min(Config.TEXT_WORKERS, total_pages // PARALLEL_TEXT_MIN_PAGES)
+        if workers <= 1:
+            for page_index in range(total_pages):
+                yield page_index, _analyze_page(backend, page_index)
+            return
+        
+        print(f"[INFO] Analizando capa de texto de {total_pages} páginas con {workers} procesos...")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_backend_worker,
+            initargs=(type(backend), backend.pdf_path, backend.reopen_args())
+        ) as executor:
+            chunksize = max(1, total_pages // (workers * 4))
+            analyses = executor.map(_analyze_page_in_worker, range(total_pages), chunksize=chunksize)
+            yield from enumerate(analyses)
+    
+    def _classify_pages_by_text_layer(self, backend):
+        """Pre-pase sobre la capa de texto: decide qué páginas necesitan OCR
+        
+        Puntúa la capa de texto de cada página (caracteres imprimibles, palabras
+        conocidas y cobertura del contenido). Las páginas sin texto o con una
+        puntuación menor que Config.TEXT_QUALITY_THRESHOLD se envían a OCR.
+        
+        Con Config.REGION_OCR, las páginas cuyo texto es bueno pero tienen
+        imágenes que la capa de texto no cubre (figuras, sellos, capturas o un
+        escaneo con solo un pie de página como texto) conservan su texto nativo
+        y solo esas regiones se envían a OCR.
+        
+        Retorna (textos_directos, paginas_ocr, paginas_mixtas): un diccionario
+        índice -> texto para las páginas con texto nativo aceptable, la lista
+        ordenada de índices de las páginas que hay que renderizar completas y
+        un diccionario índice -> análisis de las páginas con regiones para OCR.
+        """
+        native_texts = {}
+        ocr_pages = []
+        region_pages = {}
+        for i, analysis in self._analyze_text_layers(backend, backend.page_count()):
+            if "error" in analysis:
+                print(f"[WARN] Página {i+1}: Error leyendo capa de texto ({analysis['error']}), se usará OCR")
+            
+            page_text = analysis["text"].strip()
+            if not page_text:
+                ocr_pages.append(i)
+                continue
+            
+            quality = score_text_layer(page_text, analysis["text_area"], analysis["image_area"])
+            regions = analysis.get("regions") if Config.REGION_OCR else None
+            if regions and quality["text_score"] >= Config.TEXT_QUALITY_THRESHOLD:
+                native_texts[i] = page_text
+                region_pages[i] = analysis
+            elif quality["score"] >= Config.TEXT_QUALITY_THRESHOLD:
+                native_texts[i] = page_text
+            else:
+                print(f"[INFO] Página {i+1}: Capa de texto de baja calidad (puntuación {quality['score']:.2f}), se usará OCR")
+                ocr_pages.append(i)
+        return native_texts, ocr_pages, region_pages
+    
+    def _render_regions(self, backend, page_index, analysis):
+        """Renderiza y preprocesa las regiones de imagen de una página mixta"""
+        regions = []
+        for bbox in analysis["regions"]:
+            array = backend.render_region(page_index, bbox, Config.IMAGE_DPI, self._render_in_gray())
+            regions.append(self._prepare_page_image(array, page_index, {"dpi": Config.IMAGE_DPI, "region": bbox}))
+        return regions
+    
+    def _extract_mixed_page_text(self, page_index, analysis, regions):
+        """OCR de las regiones de imagen de una página mixta, combinado con su texto nativo
+        
+        Cada región (ya renderizada recortada y preprocesada) se envía sola al
+        OCR; su texto se inserta entre los bloques de texto nativo según su
+        posición vertical, para respetar el orden de lectura. Retorna (texto,
+        métricas): las métricas de generación de las regiones combinadas (ver
+        DeepSeekClient._record_stream_stats), o None sin OLLAMA_STREAM.
+        """
+        region_texts = []
+        region_stats = []
+        for region in regions:
+            bbox = region.metadata["region"]
+            try:
+                text = self.deepseek.extract_text_from_image(region).strip()
+            except Exception as e:
+                print(f"[WARN] Página {page_index+1}: Error en OCR de región {tuple(round(v) for v in bbox)}: {str(e)}")
+                continue
+            if "ocr_stream" in region.metadata:
+                region_stats.append(region.metadata["ocr_stream"])
+            if text:
+                region_texts.append((bbox, text))
+        
+        return _merge_in_reading_order(analysis["blocks"], region_texts), combine_stats(region_stats)
+    
+    def _page_tasks(self, backend, total_pages, native_texts, region_pages, page_images, progress_callback=None):
+        """Genera en orden la tarea de cada página: (índice, tipo, datos)
+        
+        Todo lo que usa el backend del PDF (renderizar páginas y regiones) se
+        hace aquí, en el hilo principal; las tareas solo necesitan el modelo
+        de OCR y se pueden ejecutar en otros hilos (ver _process_page).
+        """
+        for i in range(total_pages):
+            page_num = i + 1
+            if progress_callback:
+                progress_callback("processing", i, total_pages, f"Procesando página {page_num}/{total_pages}")
+            
+            if i in region_pages:
+                # Texto directo más OCR de las imágenes que no cubre
+                print(f"[INFO] Página {page_num}: Texto directo + OCR de {len(region_pages[i]['regions'])} región(es)")
+                try:
+                    regions = self._render_regions(backend, i, region_pages[i])
+                except Exception as e:
+                    yield i, "error", str(e)
+                    continue
+                yield i, "mixed", (region_pages[i], regions)
+            elif i in native_texts:
+                print(f"[INFO] Página {page_num}: Texto extraído directamente")
+                yield i, "native", native_texts[i]
+            else:
+                _, page_image = next(page_images)
+                blank = page_image.metadata.get("blank")
+                if blank:
+                    # En blanco o solo con el número de página: no merece una llamada al modelo
+                    if blank["reason"] == "blank":
+                        print(f"[INFO] Página {page_num}: en blanco, se omite el OCR")
+                    else:
+                        print(f"[INFO] Página {page_num}: solo {blank['marks']} marca(s) en el margen, se omite el OCR")
+                    yield i, "blank", blank["reason"]
+                else:
+                    print(f"[INFO] Página {page_num}: Sin texto directo, usando OCR...")
+                    yield i, "ocr", page_image
+    
+    def _process_page(self, task):
+        """Obtiene el texto de una tarea de _page_tasks
+        
+        Retorna (índice, texto, error, motivo_omitida, métricas_ocr): los
+        errores se devuelven en lugar de lanzarse para que el fallo de una
+        página no detenga a las demás. Las métricas son las de generación del
+        modelo (ver ollama_stream.combine_stats), o None si no hubo OCR en
+        streaming.
+        """
+        i, kind, data = task
         try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text += page_text + "\n\n"
-            return text if text.strip() else None
-        except:
-            return None
+            if kind == "error":
+                raise Exception(data)
+            if kind == "native":
+                return i, data, None, None, None
+            if kind == "blank":
+                return i, "", None, data, None
+            if kind == "mixed":
+                text, stats = self._extract_mixed_page_text(i, *data)
+                return i, text, None, None, stats
+            text = self.deepseek.extract_text_from_image(data)
+            return i, text, None, None, data.metadata.get("ocr_stream")
+        except Exception as e:
+            return i, None, str(e), None, None
+    
+    def _extract_page_texts(self, backend, total_pages, progress_dir, progress_callback=None):
+        """Obtiene el texto de cada página: texto directo si lo tiene, OCR si no
+        
+        Retorna (textos_extraidos, paginas_fallidas, paginas_omitidas,
+        paginas_truncadas, metricas_ocr). Las páginas omitidas (en blanco o
+        casi) y las truncadas (el modelo entró en bucle o la respuesta era
+        demasiado larga: su texto puede estar incompleto) se anotan como
+        diccionarios {"page", "reason"}; las métricas de generación de cada
+        página con OCR en streaming, como las de combine_stats más "page". El progreso de cada página se guarda en
+        progress_dir en cuanto se procesa.
+        
+        El OCR de varias páginas puede estar en curso a la vez: como mucho
+        tantas como indique el backend activo (OLLAMA_OCR_CONCURRENCY o
+        DEEPSEEK_OCR_CONCURRENCY). Mientras tanto se siguen renderizando y
+        preprocesando las siguientes. Los resultados se recogen en orden de
+        página y un error en una página no retrasa ni detiene las demás.
+        """
+        # Pre-pase: decidir con la capa de texto qué páginas necesitan OCR
+        native_texts, ocr_pages, region_pages = self._classify_pages_by_text_layer(backend)
+        print(f"[INFO] {len(ocr_pages)}/{total_pages} páginas necesitan OCR")
+        if region_pages:
+            print(f"[INFO] {len(region_pages)} páginas mixtas: texto nativo + OCR de sus regiones de imagen")
+        
+        # Renderizar de forma perezosa solo las páginas sin texto:
+        # cada imagen se genera justo antes de procesar su página
+        page_images = self.iter_page_images(backend.pdf_path, total_pages, pages=ocr_pages, backend=backend)
+        tasks = self._page_tasks(backend, total_pages, native_texts, region_pages, page_images, progress_callback)
+        
+        extracted_texts = []
+        failed_pages = []
+        skipped_pages = []
+        truncated_pages = []
+        ocr_stats = []
+        
+        concurrency = self.deepseek.ocr_concurrency()
+        executor = None
+        if concurrency > 1 and ocr_pages:
+            print(f"[INFO] OCR de hasta {concurrency} páginas en paralelo")
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+            results = _bounded_ordered_map(executor, self._process_page, tasks, concurrency)
+        else:
+            results = map(self._process_page, tasks)
+        
+        try:
+            for i, text, error, skipped, stats in results:
+                page_num = i + 1
+                if error is not None:
+                    error_msg = f"Error en página {page_num}: {error}"
+                    print(f"[ERROR] {error_msg}")
+                    extracted_texts.append(f"[ERROR: {error_msg}]")
+                    failed_pages.append(page_num)
+                    continue
+                
+                extracted_texts.append(text)
+                if skipped:
+                    skipped_pages.append({"page": page_num, "reason": skipped})
+                if stats is not None:
+                    ocr_stats.append(dict(stats, page=page_num))
+                    if stats["stop_reason"] in TRUNCATION_REASONS:
+                        print(f"[WARN] Página {page_num}: generación cortada ({stats['stop_reason']}), "
+                              f"el texto puede estar incompleto")
+                        truncated_pages.append({"page": page_num, "reason": stats["stop_reason"]})
+                
+                # Guardar progreso inmediatamente
+                progress_file = os.path.join(progress_dir, f"page_{page_num}.txt")
+                with open(progress_file, 'w', encoding='utf-8') as f:
+                    f.write(f"=== PÁGINA {page_num} ===\n\n")
+                    f.write(text)
+                    f.write("\n\n")
+                
+                print(f"[INFO] Página {page_num}/{total_pages} procesada y guardada")
+        finally:
+            if executor is not None:
+                results.close()  # Cancela las páginas pendientes si se interrumpe
+                executor.shutdown(wait=True)
+            page_images.close()
+        
+        return extracted_texts, failed_pages, skipped_pages, truncated_pages, ocr_stats
     
     def optimize_pdf(self, input_pdf_path, output_pdf_path, progress_callback=None, translate=False):
         """Procesa y optimiza el PDF página por página, y traduce al final si es necesario"""
@@ -199,61 +1015,19 @@ class PDFProcessor:
             if not os.path.exists(input_pdf_path):
                 raise Exception(f"El archivo de entrada no existe: {input_pdf_path}")
             
-            # Leer el PDF para obtener número de páginas
-            reader = PdfReader(input_pdf_path)
-            total_pages = len(reader.pages)
+            # Abrir el PDF con el backend configurado para obtener número de páginas
+            backend = self.open_backend(input_pdf_path)
+            total_pages = backend.page_count()
             
             # Crear carpeta para guardar progreso
             progress_dir = os.path.join(self.temp_dir, "progress")
             os.makedirs(progress_dir, exist_ok=True)
             
-            # Extraer imágenes de cada página (para OCR si es necesario)
-            if progress_callback:
-                progress_callback("extracting", 0, total_pages, "Extrayendo páginas...")
-            image_paths = self.extract_images_from_pdf(input_pdf_path, progress_callback)
-            
-            # Procesar cada página: texto directo o OCR
-            extracted_texts = []
-            failed_pages = []
-            
-            for i in range(total_pages):
-                page_num = i + 1
-                if progress_callback:
-                    progress_callback("processing", i, total_pages, f"Procesando página {page_num}/{total_pages}")
-                
-                try:
-                    # Intentar primero extraer texto directo de esta página
-                    page = reader.pages[i]
-                    page_text = page.extract_text()
-                    
-                    if page_text and page_text.strip():
-                        # Tiene texto directo
-                        print(f"[INFO] Página {page_num}: Texto extraído directamente")
-                        extracted_texts.append(page_text.strip())
-                    else:
-                        # No tiene texto, usar OCR
-                        print(f"[INFO] Página {page_num}: Sin texto directo, usando OCR...")
-                        if i < len(image_paths):
-                            text = self.deepseek.extract_text_from_image(image_paths[i])
-                            extracted_texts.append(text)
-                        else:
-                            extracted_texts.append("[ERROR: No se pudo procesar esta página]")
-                            failed_pages.append(page_num)
-                    
-                    # Guardar progreso inmediatamente
-                    progress_file = os.path.join(progress_dir, f"page_{page_num}.txt")
-                    with open(progress_file, 'w', encoding='utf-8') as f:
-                        f.write(f"=== PÁGINA {page_num} ===\n\n")
-                        f.write(extracted_texts[-1])
-                        f.write("\n\n")
-                    
-                    print(f"[INFO] Página {page_num}/{total_pages} procesada y guardada")
-                    
-                except Exception as e:
-                    error_msg = f"Error en página {page_num}: {str(e)}"
-                    print(f"[ERROR] {error_msg}")
-                    extracted_texts.append(f"[ERROR: {error_msg}]")
-                    failed_pages.append(page_num)
+            # Extraer el texto de cada página (texto directo u OCR)
+            with backend:
+                extracted_texts, failed_pages, skipped_pages, truncated_pages, ocr_stats = self._extract_page_texts(
+                    backend, total_pages, progress_dir, progress_callback
+                )
             
             method = "hybrid"  # Puede ser combinación de directo + OCR
             pages_processed = len(extracted_texts)
@@ -329,6 +1103,9 @@ class PDFProcessor:
                 "pages_processed": pages_processed,
                 "method": method,
                 "failed_pages": failed_pages,
+                "skipped_pages": skipped_pages,
+                "truncated_pages": truncated_pages,
+                "ocr_stats": ocr_stats,
                 "text_file": text_output_path,
                 "progress_dir": progress_dir,
                 "translated": translate,
@@ -339,6 +1116,8 @@ class PDFProcessor:
             
         except Exception as e:
             raise Exception(f"Error en procesamiento PDF: {str(e)}")
+        finally:
+            self.deepseek.close()
     
     def _create_optimized_pdf(self, texts, output_path, translated=False):
         """Crea PDF optimizado con el texto extraído"""
@@ -394,8 +1173,9 @@ class PDFProcessor:
         pdf.output(output_path)
     
     def cleanup(self):
-        """Limpia archivos temporales"""
+        """Limpia archivos temporales y cierra el índice de páginas"""
         import shutil
+        self.deepseek.close()
         if os.path.exists(self.temp_dir):
             try:
                 shutil.rmtree(self.temp_dir)
@@ -0,0 +1,282 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from config import Config
+
+
+# Códigos HTTP que indican un fallo pasajero (saturación, reinicio, límite de peticiones)
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Nombres de excepciones de requests/httpx/openai que indican un fallo de red pasajero
+TRANSIENT_EXCEPTIONS = (
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "TimeoutException",
+    "ConnectError", "ReadError", "WriteError", "RemoteProtocolError", "ChunkedEncodingError",
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+)
+# Latencias observadas que se guardan por backend para calcular el timeout
+LATENCY_WINDOW = 100
+# Mínimo de latencias observadas antes de ajustar el timeout
+MIN_LATENCY_SAMPLES = 5
+
+
+class BackendError(Exception):
+    """Error de un backend con la información necesaria para decidir si reintentar
+
+    transient indica si el error es pasajero (red, 429, 5xx, modelo
+    recargándose) y retry_after los segundos que pide esperar el servidor.
+    """
+
+    def __init__(self, message, status=None, transient=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Segundos que indica una cabecera Retry-After (número o fecha HTTP), o None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def response_error(response, message):
+    """BackendError para una respuesta HTTP con error (requests, httpx u openai)"""
+    status = response.status_code
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    return BackendError(message, status=status, transient=status in TRANSIENT_STATUS, retry_after=retry_after)
+
+
+def classify(error):
+    """Retorna el error como BackendError, indicando si es pasajero"""
+    if isinstance(error, BackendError):
+        return error
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    retry_after = None
+    if response is not None and getattr(response, "headers", None) is not None:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    transient = (status in TRANSIENT_STATUS or
+                 any(cls.__name__ in TRANSIENT_EXCEPTIONS for cls in type(error).__mro__))
+    return BackendError(str(error), status=status, transient=transient, retry_after=retry_after)
+
+
+def _is_timeout(error):
+    return any("Timeout" in cls.__name__ for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, base, cap):
+    """Espera antes del reintento attempt (0, 1, ...): exponencial con jitter completo
+
+    El jitter reparte en el tiempo los reintentos de varias páginas que
+    fallaron a la vez, para no volver a saturar el backend todas juntas.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Corta las llamadas a un backend que está fallando
+
+    Tras failure_threshold fallos pasajeros seguidos el circuito se abre y
+    las llamadas fallan al momento durante reset_timeout segundos, en lugar
+    de esperar a un backend caído página tras página. Después se deja pasar
+    una llamada de prueba (semiabierto): si va bien se cierra, si falla se
+    vuelve a abrir.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Lanza BackendError si el circuito está abierto; retorna True si la llamada es la de prueba"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise BackendError(f"{self.name} no disponible tras {self._failures} fallos seguidos "
+                                   f"(se reintentará en {max(0, remaining):.0f}s)")
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        """Libera la llamada de prueba sin resultado (cancelada): la siguiente puede volver a probar"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    print(f"[WARN] {self.name}: {self._failures} fallos seguidos, "
+                          f"se deja de llamar durante {self.reset_timeout:.0f}s")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyTracker:
+    """Latencias recientes de un backend para calcular el timeout de cada petición"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """Percentil q de las latencias observadas (None si hay pocas)"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class Backend:
+    """Política de reintentos, circuito y timeout de un backend (Ollama, DeepSeek, OpenAI)
+
+    call(fn) llama a fn(timeout) y reintenta los errores pasajeros con
+    espera exponencial con jitter (o la que pida el servidor con
+    Retry-After), hasta RETRY_MAX_ATTEMPTS intentos. Los errores
+    permanentes (petición inválida, clave incorrecta, respuesta vacía) no
+    se reintentan.
+
+    Con concurrency, call() no deja más de ese número de peticiones en
+    curso a la vez entre todos los hilos (páginas y piezas de una página);
+    las esperas entre reintentos no ocupan hueco. call_async no lo usa: el
+    cliente asyncio tiene su propio semáforo.
+
+    Con ADAPTIVE_TIMEOUTS el timeout de cada petición es el percentil
+    TIMEOUT_PERCENTILE de las latencias observadas por TIMEOUT_MULTIPLIER,
+    entre TIMEOUT_MIN_SECONDS y max_timeout; hasta tener suficientes
+    muestras se usa max_timeout. Tras un timeout, el siguiente intento
+    dobla el plazo.
+    """
+
+    def __init__(self, name, max_timeout, concurrency=None):
+        self.name = name
+        self.max_timeout = max_timeout
+        # Peticiones en curso como mucho (entre todos los hilos) en call(); None = sin límite
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+        self.breaker = CircuitBreaker(name, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS)
+        self.latency = LatencyTracker()
+
+    def timeout(self):
+        """Timeout de la próxima petición en segundos"""
+        if not Config.ADAPTIVE_TIMEOUTS:
+            return self.max_timeout
+        observed = self.latency.percentile(Config.TIMEOUT_PERCENTILE)
+        if observed is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(Config.TIMEOUT_MIN_SECONDS, observed * Config.TIMEOUT_MULTIPLIER))
+
+    def _attempts(self):
+        return max(1, Config.RETRY_MAX_ATTEMPTS)
+
+    def _after_failure(self, error, attempt):
+        """Registra el fallo; retorna la espera antes de reintentar o lanza el error"""
+        classified = classify(error)
+        if not classified.transient:
+            # El backend respondió: el error es de la petición, no del servicio
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt + 1 >= self._attempts() or self.breaker.is_open:
+            raise error
+        delay = classified.retry_after
+        if delay is None:
+            delay = backoff_delay(attempt, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY)
+        delay = min(delay, Config.RETRY_MAX_DELAY)
+        print(f"[WARN] {self.name}: {classified} - reintento {attempt + 2}/{self._attempts()} en {delay:.1f}s")
+        return delay
+
+    def _timeout_for(self, timeouts):
+        return min(self.max_timeout, self.timeout() * 2 ** timeouts)
+
+    def call(self, fn):
+        """Llama a fn(timeout) con reintentos, circuito y timeout adaptativo"""
+        timeouts = 0
+        for attempt in range(self._attempts()):
+            probe = self.breaker.allow()
+            try:
+                started = time.monotonic()
+                if self.slots is None:
+                    result = fn(self._timeout_for(timeouts))
+                else:
+                    with self.slots:
+                        started = time.monotonic()
+                        result = fn(self._timeout_for(timeouts))
+            except Exception as e:
+                timeouts += _is_timeout(e)
+                time.sleep(self._after_failure(e, attempt))
+                continue
+            except BaseException:
+                # Interrumpida (Ctrl+C): no dice nada del backend
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.latency.record(time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, fn):
+        """Versión asyncio de call: fn(timeout) es una corrutina"""
+        timeouts = 0
+        for attempt in range(self._attempts()):
+            probe = self.breaker.allow()
+            started = time.monotonic()
+            try:
+                result = await fn(self._timeout_for(timeouts))
+            except Exception as e:
+                timeouts += _is_timeout(e)
+                await asyncio.sleep(self._after_failure(e, attempt))
+                continue
+            except BaseException:
+                # Cancelada (plazo de la página, tarea cancelada): no dice nada del backend
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.latency.record(time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+
+
+_backends = {}
+_lock = threading.Lock()
+
+
+def backend(name, max_timeout, concurrency=None):
+    """Política compartida del backend name (la misma para todos los clientes e hilos)"""
+    with _lock:
+        if name not in _backends:
+            _backends[name] = Backend(name, max_timeout, concurrency)
+        return _backends[name]
@@ -0,0 +1,74 @@
+"""
+Script para comprobar la puntuación de calidad de la capa de texto
+
+Las capas de texto reales en varios idiomas deben superar
+TEXT_QUALITY_THRESHOLD; la basura típica de los mapas ToUnicode rotos
+(alfabeto desplazado, símbolos de Latin-1, identificadores de glifo) debe
+quedar por debajo para que la página se envíe a OCR.
+"""
+from config import Config
+from text_quality import score_text_layer
+
+
+TEXTOS_REALES = {
+    "español": "El cliente abonará la factura número 2024-117 por un importe total de 1.250,00 EUR antes del "
+               "15 de marzo. En caso de retraso se aplicarán los intereses de demora previstos en la ley y en "
+               "las condiciones generales del contrato.",
+    "inglés": "The supplier shall deliver the goods within thirty days of the date of the order. Any delay must "
+              "be notified in writing to the customer, who may then terminate the agreement without penalty "
+              "and claim a refund of the amounts already paid.",
+    "alemán": "Der Auftragnehmer verpflichtet sich, die vereinbarten Leistungen gemäß den Bestimmungen dieses "
+              "Vertrages fristgerecht zu erbringen. Die Haftung für leichte Fahrlässigkeit ist ausgeschlossen, "
+              "soweit gesetzlich zulässig. Änderungen bedürfen der Schriftform. Gerichtsstand ist München.",
+    "italiano": "Il fornitore si impegna a consegnare la merce entro trenta giorni dalla data dell'ordine. "
+                "Eventuali ritardi dovranno essere comunicati per iscritto. Il presente contratto è regolato "
+                "dalla legge italiana e le parti accettano la giurisdizione del tribunale di Milano.",
+    "polaco": "Wykonawca zobowiązuje się do terminowego wykonania prac zgodnie z harmonogramem, który stanowi "
+              "załącznik do umowy. Zmiany umowy wymagają formy pisemnej pod rygorem nieważności, a spory "
+              "rozstrzyga sąd właściwy dla siedziby zamawiającego.",
+    "ruso": "Исполнитель обязуется выполнить работы в срок, установленный настоящим договором. "
+            "Оплата производится в течение тридцати дней.",
+    "tabla": "| Qty | Price | Total |\n| 10 | 12.50 | 125.00 |\n| 1 | 3.00 | 3.00 |\n| 3 | 0.99 | 2.97 |",
+}
+
+
+def desplazar(texto, n):
+    """Desplaza n posiciones los caracteres ASCII imprimibles (como un mapa ToUnicode roto)"""
+    return "".join(chr(ord(c) + n) if not c.isspace() and 32 < ord(c) + n < 127 else c for c in texto)
+
+
+def textos_basura():
+    basura = {
+        "símbolos Latin-1": "Þ¿ Ý¾ ÞÝ¿ º¾Ý Þ¿Ý ¾º Ý¿Þ ºÞ ¾Ý¿ Þº Ý¾Þ ¿º Þ¿ Ý¾ ÞÝ¿ º¾Ý",
+        "identificadores de glifo": "G2K3 hTqZ xWvR bNmK 4f7G qPzX tRwK 9jLm zXcV bNmQ wRtY pLkJ hGfD sAqW",
+    }
+    for idioma in ("español", "inglés", "alemán"):
+        for n in (3, -29, 1, -1, 2, -3):
+            basura[f"{idioma} desplazado {n:+d}"] = desplazar(TEXTOS_REALES[idioma], n)
+    return basura
+
+
+def main():
+    umbral = Config.TEXT_QUALITY_THRESHOLD
+    fallos = 0
+    for nombre, texto in TEXTOS_REALES.items():
+        puntuacion = score_text_layer(texto)["text_score"]
+        ok = puntuacion >= umbral
+        fallos += not ok
+        print(f"{'✓' if ok else '❌'} Texto real ({nombre}): {puntuacion:.2f}")
+    for nombre, texto in textos_basura().items():
+        puntuacion = score_text_layer(texto)["text_score"]
+        ok = puntuacion < umbral
+        fallos += not ok
+        print(f"{'✓' if ok else '❌'} Basura ({nombre}): {puntuacion:.2f}")
+
+    print()
+    if fallos:
+        print(f"❌ {fallos} comprobación(es) fallida(s) con umbral {umbral}")
+    else:
+        print(f"✓ Todas las comprobaciones superadas con umbral {umbral}")
+    return fallos
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
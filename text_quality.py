@@ -0,0 +1,189 @@
+import re
+import unicodedata
+
+
+# Palabras vacías más frecuentes de los idiomas de alfabeto latino habituales
+# (español, inglés, francés, alemán, italiano, portugués, neerlandés, catalán,
+# escandinavos, polaco, checo, rumano, turco, húngaro, finés, indonesio). En
+# texto real una buena parte de las palabras son de este tipo en cualquiera de
+# ellos; en texto con las letras desplazadas (mapas ToUnicode rotos: "Wkh
+# txlfn eurzq") casi ninguna, aunque tenga forma de palabra.
+STOP_WORDS = set("""
+a al con de del el en es la las lo los no para por que se su un una y o como más pero sus le ya este esta
+entre sobre sin ser está son fue tiene todo también cuando hasta desde cada según
+the of and to in is it that for on with as was be by at this are or from an not have has which shall
+will may must any all been their they them its who such other
+le la les de des du et en un une est que qui dans pour pas sur au aux ce il elle se ne par avec
+ses son leur sont été être cette tout plus doit peut sans
+der die das und ist nicht ein eine zu den von mit sich des auf für im dem auch es an als wird
+werden sind oder bei nach wie nur durch zur zum über einer eines
+il di che e è un per non con una sono del della le gli da si nel alla al lo dello degli delle nella
+nelle alle dalla dal dei questo questa come anche più essere stato deve può tra loro suo sua entro dopo
+o os as um uma não com para em do da dos das que se ao na no é pelo pela mais seu são foi
+pode deve sem também isso
+de het een en van in is dat op te zijn met voor niet aan er ook als door naar bij wordt worden deze
+i el la els les amb per que del un una és no són
+och att det som en är på för med den inte av og er til ikke at jeg har var
+i w na z do że się nie to jest jak od po ale oraz przez przy dla lub który która które jego jej
+tak już tylko może będzie został zgodnie pod nad jako tym tego
+a v se na je že to s z do o jako ale pro jsou nebo které který byl jeho její
+și în de la cu pe nu că un o este sau care din pentru mai sunt fost prin
+ve bir bu da de için ile ne olan gibi daha çok
+a az és hogy nem is egy meg van volt mint csak már
+ja on ei se että oli ovat myös kun sen hän
+dan yang di ini itu dengan untuk tidak dari akan pada
+à é où ça sí él tú mí né
+""".split())
+
+# Palabras de alfabeto latino mínimas para juzgar la proporción de palabras vacías
+MIN_LATIN_WORDS = 20
+# Proporción de palabras vacías a partir de la cual el texto latino se considera lenguaje normal
+STOP_WORD_REFERENCE_RATIO = 0.1
+# Caracteres mínimos (sin espacios) para que la proporción de palabras sea fiable
+MIN_CHARS_FOR_WORDS = 20
+# Proporción de caracteres en palabras a partir de la cual el texto se considera lenguaje normal
+WORD_REFERENCE_RATIO = 0.6
+# Longitud máxima de una palabra (los compuestos alemanes rondan los 30-40 caracteres)
+MAX_WORD_LENGTH = 40
+# Fracción del contenido de la página que debe ocupar la capa de texto para considerarla completa
+COVERAGE_REFERENCE_RATIO = 0.2
+
+_VOWELS = set("aeiouyáéíóúýàèìòùâêîôûäëïöüÿåæøœãõąęěůőű")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_REPEATED_RE = re.compile(r"(.)\1{3,}")
+
+
+def printable_ratio(text):
+    """Proporción de caracteres imprimibles y válidos (sin controles, U+FFFD ni uso privado)"""
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    valid = 0
+    for c in chars:
+        category = unicodedata.category(c)
+        if c != "\ufffd" and category not in ("Cc", "Cf", "Co", "Cs", "Cn"):
+            valid += 1
+    return valid / len(chars)
+
+
+def _is_latin(c):
+    return unicodedata.name(c, "").startswith("LATIN")
+
+
+def plausible_word(token):
+    """Indica si un token tiene forma de palabra o número en cualquier idioma
+
+    No se usa diccionario: una palabra son solo letras (o solo dígitos), en
+    minúsculas, mayúsculas o con la inicial en mayúscula, sin el mismo
+    carácter cuatro veces seguido y, en alfabeto latino, con alguna vocal a
+    partir de tres letras (en escrituras sin mayúsculas basta con que sean
+    letras). Las palabras latinas de una o dos letras con acentos solo
+    cuentan si son palabras vacías conocidas ("à", "él"). La basura de los
+    mapas ToUnicode rotos mezcla letras, dígitos y símbolos, alterna
+    mayúsculas o encadena consonantes; el texto con las letras desplazadas
+    tiene forma de palabra y lo detecta stop_word_ratio.
+    """
+    if token.isdigit():
+        return True
+    if not token.isalpha() or _REPEATED_RE.search(token):
+        return False
+    if token.lower() == token.upper():
+        # Escrituras sin mayúsculas ni espacios entre palabras (chino, japonés,
+        # árabe...); "º" y "ª" de Latin-1 no son una de ellas
+        return all(ord(c) > 0x2FF for c in token)
+    if len(token) > MAX_WORD_LENGTH:
+        return False
+    if not (token.islower() or token.isupper() or (token[0].isupper() and token[1:].islower())):
+        return False
+    if _is_latin(token[0]):
+        if len(token) <= 2 and not token.isascii():
+            # "Þ", "ÝÞ": letras sueltas de Latin-1 que deja la basura de símbolos
+            return token.lower() in STOP_WORDS
+        if len(token) >= 3:
+            return any(c in _VOWELS for c in token.lower())
+    return True
+
+
+def word_ratio(text):
+    """Proporción de caracteres (sin espacios) que forman parte de palabras o números plausibles
+
+    Es independiente del idioma; los símbolos y la puntuación cuentan como
+    caracteres fuera de palabras, así que una página de símbolos sueltos
+    puntúa cerca de 0. Retorna None si el texto es demasiado corto para
+    juzgarlo.
+    """
+    total = sum(1 for c in text if not c.isspace())
+    if total < MIN_CHARS_FOR_WORDS:
+        return None
+    in_words = sum(len(t) for t in _TOKEN_RE.findall(text) if plausible_word(t))
+    return in_words / total
+
+
+def stop_word_ratio(text):
+    """Proporción de palabras de alfabeto latino que son palabras vacías (STOP_WORDS)
+
+    Distingue el lenguaje real del texto con las letras desplazadas, que
+    tiene forma de palabra pero ninguna palabra vacía. Retorna None si hay
+    menos de MIN_LATIN_WORDS palabras latinas (textos cortos, tablas o
+    escrituras no latinas, que se juzgan solo por word_ratio).
+    """
+    words = [t.lower() for t in _TOKEN_RE.findall(text) if t.isalpha() and _is_latin(t[0])]
+    if len(words) < MIN_LATIN_WORDS:
+        return None
+    # Las de una o dos letras no cuentan: al desplazar el alfabeto muchas
+    # caen por azar en otra palabra vacía corta ("od", "ne", "a")
+    return sum(1 for w in words if len(w) >= 3 and w in STOP_WORDS) / len(words)
+
+
+def coverage_ratio(text_area, image_area):
+    """Cuánto del contenido de la página explica la capa de texto (0 a 1)
+
+    Una página con un gran escaneo y solo un pie de página como texto tiene
+    una cobertura muy baja; una página de texto puro, 1. Retorna None si no
+    se conocen las áreas.
+    """
+    if text_area is None or image_area is None:
+        return None
+    content_area = text_area + image_area
+    if content_area <= 0:
+        return None
+    return min(1.0, text_area / (COVERAGE_REFERENCE_RATIO * content_area))
+
+
+def score_text_layer(text, text_area=None, image_area=None):
+    """Calcula la calidad de la capa de texto de una página
+
+    Retorna un diccionario con las métricas individuales y una puntuación
+    global entre 0 y 1: la proporción de caracteres imprimibles multiplicada
+    por la peor de las otras métricas (palabras plausibles, palabras vacías
+    y cobertura), ya que cualquiera de ellas basta para descartar la capa de
+    texto. Las
+    métricas que no se pueden calcular cuentan como neutras (1).
+    
+    "text_score" es la misma puntuación sin la cobertura: indica si el texto
+    en sí es fiable aunque no cubra todo el contenido de la página.
+    """
+    if not text or not text.strip():
+        return {"printable": 0.0, "words": None, "stop_words": None, "coverage": None,
+                "score": 0.0, "text_score": 0.0}
+
+    printable = printable_ratio(text)
+    words = word_ratio(text)
+    stop_words = stop_word_ratio(text)
+    coverage = coverage_ratio(text_area, image_area)
+
+    words_score = 1.0 if words is None else min(1.0, words / WORD_REFERENCE_RATIO)
+    if stop_words is not None:
+        words_score = min(words_score, stop_words / STOP_WORD_REFERENCE_RATIO)
+    coverage_score = 1.0 if coverage is None else coverage
+    score = printable * min(words_score, coverage_score)
+    text_score = printable * words_score
+
+    return {
+        "printable": printable,
+        "words": words,
+        "stop_words": stop_words,
+        "coverage": coverage,
+        "score": score,
+        "text_score": text_score,
+    }
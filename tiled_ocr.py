@@ -0,0 +1,117 @@
+import difflib
+import math
+import re
+from page_image import PageImage
+
+
+# Solo se divide la página si supera en este factor los píxeles máximos del modelo
+# (por debajo compensa más reducirla un poco que hacer varias peticiones)
+TILE_TRIGGER_RATIO = 1.5
+# Relación ancho/alto máxima de una franja antes de dividirla también en columnas
+MAX_TILE_ASPECT = 4
+# Líneas repetidas que se buscan como máximo entre dos franjas consecutivas
+MAX_OVERLAP_LINES = 6
+# Similitud mínima para considerar que dos líneas son la misma (el OCR de un
+# mismo texto en dos franjas puede variar ligeramente)
+LINE_SIMILARITY = 0.8
+# Las líneas más cortas deben coincidir exactamente ("Total: 100" y "Total: 180"
+# son muy parecidas pero distintas)
+FUZZY_MIN_LENGTH = 20
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def needs_tiling(page, max_pixels):
+    """Indica si la página es demasiado grande para enviarla entera al modelo"""
+    return bool(max_pixels) and page.width * page.height > max_pixels * TILE_TRIGGER_RATIO
+
+
+def _axis_tiles(length, tile, overlap):
+    """Intervalos [inicio, fin) que cubren length con piezas de como mucho tile y solape overlap"""
+    if length <= tile:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    size = math.ceil((length + (count - 1) * overlap) / count)
+    step = size - overlap
+    return [(i * step, min(length, i * step + size)) for i in range(count)]
+
+
+def tile_grid(width, height, max_pixels, overlap):
+    """Rectángulos (x0, y0, x1, y1) de las piezas, por filas y de izquierda a derecha
+
+    Se usan franjas horizontales de todo el ancho (conservan las líneas de
+    texto completas) mientras no sean más anchas que MAX_TILE_ASPECT veces
+    su alto; las páginas muy anchas (planos, hojas A3 apaisadas) se dividen
+    además en columnas. Cada pieza tiene como mucho max_pixels píxeles.
+    """
+    tile_width = min(width, int(math.sqrt(max_pixels * MAX_TILE_ASPECT)))
+    columns = _axis_tiles(width, tile_width, overlap)
+    column_width = max(x1 - x0 for x0, x1 in columns)
+    tile_height = max(overlap + 1, max_pixels // column_width)
+    rows = _axis_tiles(height, tile_height, overlap)
+    return [[(x0, y0, x1, y1) for x0, x1 in columns] for y0, y1 in rows]
+
+
+def split_page(page, max_pixels, overlap):
+    """Divide la página en piezas solapadas (lista de filas de PageImage)
+
+    Cada pieza es una vista del array de la página (sin copiar) y guarda su
+    rectángulo en metadata["tile"].
+    """
+    grid = tile_grid(page.width, page.height, max_pixels, overlap)
+    tiles = []
+    for row in grid:
+        tiles.append([
+            PageImage(page.array[y0:y1, x0:x1], index=page.index,
+                      metadata=dict(page.metadata, tile=(x0, y0, x1, y1)))
+            for x0, y0, x1, y1 in row
+        ])
+    return tiles
+
+
+def _normalize(line):
+    return _SPACES_RE.sub(" ", line).strip().lower()
+
+
+def _same_line(a, b):
+    if a == b:
+        return True
+    if min(len(a), len(b)) < FUZZY_MIN_LENGTH:
+        return False
+    return difflib.SequenceMatcher(None, a, b).ratio() >= LINE_SIMILARITY
+
+
+def _same_lines(a, b):
+    return len(a) == len(b) and all(_same_line(x, y) for x, y in zip(a, b))
+
+
+def remove_overlap(previous, text):
+    """Quita del principio de text las líneas que repiten el final de previous
+
+    Las franjas se solapan, así que las líneas de la zona común aparecen al
+    final de una y al principio de la siguiente. Se busca el mayor número de
+    líneas (hasta MAX_OVERLAP_LINES) que coinciden, comparando sin
+    mayúsculas ni espacios repetidos y tolerando pequeñas diferencias.
+    """
+    previous_lines = [_normalize(line) for line in previous.splitlines() if line.strip()]
+    lines = text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    normalized = [_normalize(lines[i]) for i in content]
+
+    for count in range(min(MAX_OVERLAP_LINES, len(previous_lines), len(normalized)), 0, -1):
+        if _same_lines(previous_lines[-count:], normalized[:count]):
+            return "\n".join(lines[content[count - 1] + 1:]).strip("\n")
+    return text
+
+
+def stitch(texts):
+    """Une los textos de las piezas (lista de filas) en orden de lectura
+
+    El solape se elimina entre piezas consecutivas de la misma columna; las
+    piezas de una misma fila se concatenan de izquierda a derecha.
+    """
+    stitched = [list(row) for row in texts]
+    for r in range(1, len(texts)):
+        for c in range(len(texts[r])):
+            stitched[r][c] = remove_overlap(texts[r - 1][c], texts[r][c])
+    return "\n".join(text.strip("\n") for row in stitched for text in row if text.strip())
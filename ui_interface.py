@@ -219,6 +219,20 @@ class PDFOptimizerUI:
         if failed_pages:
             self.log_result(f"⚠️ Páginas con error: {', '.join(map(str, failed_pages))}")
         
+        # Páginas en blanco o con solo el número de página que no se enviaron al OCR
+        skipped_pages = result.get('skipped_pages', [])
+        blank_pages = [str(p['page']) for p in skipped_pages if p['reason'] == "blank"]
+        numbered_pages = [str(p['page']) for p in skipped_pages if p['reason'] != "blank"]
+        if blank_pages:
+            self.log_result(f"⏭️ Páginas en blanco omitidas: {', '.join(blank_pages)}")
+        if numbered_pages:
+            self.log_result(f"⏭️ Páginas con solo el número de página omitidas: {', '.join(numbered_pages)}")
+        
+        # Páginas cuyo OCR se cortó (bucle del modelo o respuesta demasiado larga)
+        truncated_pages = result.get('truncated_pages', [])
+        if truncated_pages:
+            self.log_result(f"✂️ Páginas con texto posiblemente incompleto: {', '.join(str(p['page']) for p in truncated_pages)}")
+        
         self.log_result(f"📦 Tamaño original: {result['original_size'] / 1024:.1f} KB")
         self.log_result(f"📦 Tamaño optimizado: {result['optimized_size'] / 1024:.1f} KB")
         self.log_result(f"🎯 Reducción: {result['compression_ratio']:.1f}%")
@@ -0,0 +1,106 @@
+import cv2
+from page_image import PageImage, MIME_TYPES
+
+
+# Intentos máximos de reducir la página cuando ninguna codificación cabe en el presupuesto
+MAX_DOWNSCALE_ATTEMPTS = 4
+# Margen al calcular la nueva resolución a partir de los bytes sobrantes
+DOWNSCALE_MARGIN = 0.9
+
+
+def fit_pixels(page, max_pixels):
+    """Retorna la página reducida para no superar max_pixels (la misma si ya cabe)
+
+    Las páginas binarizadas se vuelven a binarizar tras reducirlas, para
+    que sigan codificándose como PNG de 1 bit.
+    """
+    pixels = page.width * page.height
+    if not max_pixels or pixels <= max_pixels:
+        return page
+    scale = (max_pixels / pixels) ** 0.5
+    size = (max(1, int(page.width * scale)), max(1, int(page.height * scale)))
+    array = cv2.resize(page.array, size, interpolation=cv2.INTER_AREA)
+    if page.bilevel:
+        _, array = cv2.threshold(array, 127, 255, cv2.THRESH_BINARY)
+    metadata = dict(page.metadata, upload_scale=page.metadata.get("upload_scale", 1.0) * scale)
+    return PageImage(array, index=page.index, metadata=metadata)
+
+
+def _largest_quality_within(page, fmt, max_bytes, low, high):
+    """Búsqueda binaria de la mayor calidad cuyo tamaño no supera max_bytes
+
+    Retorna (calidad, datos) o None si ni la calidad mínima cabe.
+    """
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = page.encode(fmt, quality)
+        if len(data) <= max_bytes:
+            best = (quality, data)
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def _smallest_encoding(page, budget):
+    """Codificación más pequeña de la página entre los formatos del presupuesto
+
+    Retorna (formato, calidad, datos). Las páginas binarizadas van siempre
+    como PNG de 1 bit (sin pérdidas y mucho menor que cualquier formato con
+    pérdidas). Para gris o color se comparan PNG y los formatos con pérdidas
+    a la calidad objetivo; si el menor no cabe en max_bytes, se busca la
+    mayor calidad que cabe, sin bajar de min_quality.
+    """
+    formats = budget["formats"]
+    if page.bilevel and "png" in formats:
+        return "png", None, page.encode("png")
+
+    candidates = []
+    for fmt in formats:
+        quality = None if fmt == "png" else budget["quality"]
+        candidates.append((fmt, quality, page.encode(fmt, quality)))
+    fmt, quality, data = min(candidates, key=lambda candidate: len(candidate[2]))
+    if len(data) <= budget["max_bytes"] or quality is None:
+        return fmt, quality, data
+
+    found = _largest_quality_within(page, fmt, budget["max_bytes"], budget["min_quality"], quality - 1)
+    if found is None:
+        return fmt, budget["min_quality"], page.encode(fmt, budget["min_quality"])
+    return fmt, found[0], found[1]
+
+
+def encode_for_upload(page, budget):
+    """Codifica una página para enviarla al modelo dentro del presupuesto del backend
+
+    budget es un diccionario con:
+    - formats: formatos que acepta el backend ("png", "jpeg", "webp")
+    - max_pixels: píxeles máximos (resolución de entrada del modelo; 0 = sin límite)
+    - max_bytes: tamaño máximo de la imagen codificada (antes de base64)
+    - quality / min_quality: calidad objetivo y mínima de JPEG/WebP
+
+    Retorna un diccionario con format, mime_type, data, quality, width y
+    height. Si ninguna codificación cabe en max_bytes, reduce la página en
+    proporción a los bytes sobrantes y vuelve a intentarlo.
+    """
+    page = fit_pixels(page, budget["max_pixels"])
+    fmt, quality, data = _smallest_encoding(page, budget)
+    for _ in range(MAX_DOWNSCALE_ATTEMPTS):
+        if len(data) <= budget["max_bytes"]:
+            break
+        pixels = page.width * page.height
+        page = fit_pixels(page, int(pixels * budget["max_bytes"] / len(data) * DOWNSCALE_MARGIN))
+        fmt, quality, data = _smallest_encoding(page, budget)
+    
+    if len(data) > budget["max_bytes"]:
+        print(f"[WARN] Página {page.page_num}: {len(data)/1024/1024:.1f}MB, no cabe en el límite de "
+              f"{budget['max_bytes']/1024/1024:.1f}MB")
+
+    return {
+        "format": fmt,
+        "mime_type": MIME_TYPES[fmt],
+        "data": data,
+        "quality": quality,
+        "width": page.width,
+        "height": page.height,
+    }